@@ -1,15 +1,46 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr, TypeAdapter
+from typing import Literal
 import json
+import os
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+import clock
+from market import get_share_prices, get_cached_share_prices
+from lots import Lot, LotBook, TAX_LOT_POLICY
+from database import (
+    transaction,
+    write_account,
+    read_account,
+    reset_account,
+    write_trade,
+    write_aggregates,
+    read_lots,
+    read_positions,
+    append_event,
+    events_since_snapshot,
+    write_snapshot,
+    read_snapshot,
+    read_events,
+    read_transactions,
+    read_recent_transactions,
+    write_portfolio_value,
+    compact_portfolio_values,
+    read_portfolio_values,
+    write_log,
+)
 
 load_dotenv(override=True)
 
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
 
+# How many events may follow an account's latest snapshot before another is taken
+ACCOUNT_SNAPSHOT_EVERY = int(os.getenv("ACCOUNT_SNAPSHOT_EVERY", "100"))
+# How many of the latest portfolio values a report includes
+REPORT_RECENT_VALUES = int(os.getenv("REPORT_RECENT_VALUES", "10"))
+# How many of the latest transactions a report includes; list_transactions has them all
+REPORT_RECENT_TRANSACTIONS = int(os.getenv("REPORT_RECENT_TRANSACTIONS", "10"))
+
 
 class Transaction(BaseModel):
     symbol: str
@@ -25,118 +56,389 @@ class Transaction(BaseModel):
         return f"{abs(self.quantity)} shares of {self.symbol} at {self.price} each."
 
 
+TRANSACTION_FIELDS = ("symbol", "quantity", "price", "timestamp", "rationale")
+# Validates and dumps a whole history in one call into pydantic's core, instead of model by model
+TRANSACTION_LIST = TypeAdapter(list[Transaction])
+
+
+class TransactionHistory:
+    """
+    An account's fills, kept as the plain (symbol, quantity, price, timestamp, rationale) tuples
+    read from the ledger; they only become Transaction models when they are listed.
+    """
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: list[tuple] | None = None):
+        self.rows = rows if rows is not None else []
+
+    def append(self, transaction: Transaction):
+        self.rows.append((transaction.symbol, transaction.quantity, transaction.price, transaction.timestamp, transaction.rationale))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def models(self) -> list[Transaction]:
+        return TRANSACTION_LIST.validate_python([dict(zip(TRANSACTION_FIELDS, row)) for row in self.rows])
+
+
+class Order(BaseModel):
+    symbol: str
+    side: Literal["buy", "sell"]
+    quantity: int
+
+
 class Account(BaseModel):
     name: str
     balance: float
     strategy: str
     holdings: dict[str, int]
-    transactions: list[Transaction]
-    portfolio_value_time_series: list[tuple[str, float]]
+    net_invested: float = 0.0
+    realized_pnl: float = 0.0
+    cost_basis: dict[str, float] = {}
+    _transactions: TransactionHistory | None = PrivateAttr(default=None)
+    _portfolio_value_time_series: list[tuple[str, float]] | None = PrivateAttr(default=None)
+    _lot_books: dict[str, LotBook] = PrivateAttr(default_factory=dict)
 
     @classmethod
     def get(cls, name: str):
         fields = read_account(name.lower())
         if not fields:
-            fields = {
-                "name": name.lower(),
-                "balance": INITIAL_BALANCE,
-                "strategy": "",
-                "holdings": {},
-                "transactions": [],
-                "portfolio_value_time_series": []
-            }
-            write_account(name, fields)
+            account = cls(name=name.lower(), balance=INITIAL_BALANCE, strategy="", holdings={})
+            with account.unit_of_work():
+                write_account(name, INITIAL_BALANCE, "", TAX_LOT_POLICY)
+                account.record_event("opened", balance=INITIAL_BALANCE, strategy="")
+            return account
+        elif cls.needs_rebuild(fields):
+            account = cls(**{**fields, "net_invested": 0.0, "realized_pnl": 0.0})
+            # Under the write lock, so that no trade lands between reading the ledger and replacing the aggregates
+            with account.unit_of_work():
+                account.reload()
+                if cls.needs_rebuild(read_account(account.name)):
+                    account.rebuild_aggregates()
+            return account
         return cls(**fields)
-    
-    
+
+    @staticmethod
+    def needs_rebuild(fields: dict) -> bool:
+        """ Whether an account's lots and aggregates, as read, were never built or built under another lot policy. """
+        return fields["lot_policy"] != TAX_LOT_POLICY or fields["net_invested"] is None
+
+    @classmethod
+    def as_of(cls, name: str, when: str):
+        """
+        Reconstruct the account's balance, strategy and holdings as they were at the given time,
+        formatted like "%Y-%m-%d %H:%M:%S", from the latest snapshot by then and the events after
+        it. Returns None if the ledger has nothing for the account by then.
+        """
+        snapshot = read_snapshot(name, when)
+        event_id, state = snapshot or (0, None)
+        for _, _, type, payload in read_events(name, event_id, when):
+            state = cls.apply_event(state, type, payload)
+        if state is None:
+            return None
+        return cls(name=name.lower(), **state)
+
+    @staticmethod
+    def apply_event(state: dict | None, type: str, payload: dict) -> dict | None:
+        """ Fold one event from the ledger into an account's balance, strategy and holdings. """
+        if type in ("opened", "reset"):
+            return {"balance": payload["balance"], "strategy": payload["strategy"], "holdings": {}}
+        if state is None:
+            return None
+        if type == "trade":
+            symbol, quantity = payload["symbol"], payload["quantity"]
+            state["balance"] -= quantity * payload["price"]
+            state["holdings"][symbol] = state["holdings"].get(symbol, 0) + quantity
+            if not state["holdings"][symbol]:
+                del state["holdings"][symbol]
+        elif type == "deposit":
+            state["balance"] += payload["amount"]
+        elif type == "withdraw":
+            state["balance"] -= payload["amount"]
+        elif type == "strategy":
+            state["strategy"] = payload["strategy"]
+        return state
+
+    def record_event(self, type: str, **payload):
+        """
+        Append a mutation to the event ledger, after applying it to this account, and take a
+        snapshot once ACCOUNT_SNAPSHOT_EVERY events have followed the last one. Call within a unit of work.
+        """
+        when = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        event_id = append_event(self.name, when, type, payload)
+        if events_since_snapshot(self.name) >= ACCOUNT_SNAPSHOT_EVERY:
+            state = {"balance": self.balance, "strategy": self.strategy, "holdings": self.holdings}
+            write_snapshot(self.name, event_id, when, state)
+
+    @property
+    def transactions(self) -> TransactionHistory:
+        """ The account's trade history, read from the ledger the first time it is needed. """
+        if self._transactions is None:
+            self._transactions = TransactionHistory(read_transactions(self.name))
+        return self._transactions
+
+    @property
+    def portfolio_value_time_series(self) -> list[tuple[str, float]]:
+        """ The recorded portfolio values, daily then hourly then at full resolution, read the first time they are needed. """
+        if self._portfolio_value_time_series is None:
+            self._portfolio_value_time_series = read_portfolio_values(self.name)
+        return self._portfolio_value_time_series
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Group every write made inside, including log entries, into one atomic commit; a unit of
+        work opened inside another joins it. Fetch prices before entering, so that the database
+        write lock is never held across a network call. If it raises, discard this Account.
+        """
+        with transaction():
+            yield self
+
+    def reload(self):
+        """
+        Re-read the account's state. Call it first thing in a unit of work that decides from the
+        balance or holdings, or writes them: a fill or another process may have changed them since
+        this Account was loaded, and the unit of work's write lock keeps them from changing again.
+        """
+        fields = read_account(self.name)
+        if not fields:
+            return
+        fields.pop("name")
+        fields.pop("lot_policy")
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if any(getattr(self, key) != value for key, value in fields.items()):
+            for key, value in fields.items():
+                setattr(self, key, value)
+            self._lot_books = {}
+            self._transactions = None
+            self._portfolio_value_time_series = None
+
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        write_account(self.name, self.balance, self.strategy)
 
     def reset(self, strategy: str):
         self.balance = INITIAL_BALANCE
         self.strategy = strategy
         self.holdings = {}
-        self.transactions = []
-        self.portfolio_value_time_series = []
-        self.save()
+        self.net_invested = 0.0
+        self.realized_pnl = 0.0
+        self.cost_basis = {}
+        self._transactions = TransactionHistory()
+        self._portfolio_value_time_series = []
+        self._lot_books = {}
+        with self.unit_of_work():
+            reset_account(self.name, self.balance, self.strategy, TAX_LOT_POLICY)
+            self.record_event("reset", balance=self.balance, strategy=self.strategy)
+
+    def lot_book(self, symbol: str) -> LotBook:
+        """ The open tax lots of a symbol, read from the ledger the first time they are needed. """
+        if symbol not in self._lot_books:
+            lots, realized_pnl = read_lots(self.name, symbol)
+            self._lot_books[symbol] = LotBook(TAX_LOT_POLICY, [Lot(*lot) for lot in lots], realized_pnl)
+        return self._lot_books[symbol]
+
+    def apply_to_aggregates(self, symbol: str, quantity: int, price: float, timestamp: str, book: LotBook) -> dict:
+        """ Fold one trade into the symbol's lots and the running aggregates; returns the position's changes. """
+        self.net_invested += quantity * price
+        if quantity > 0:
+            changed, closed = book.buy(quantity, price, timestamp), []
+        else:
+            realized, changed, closed = book.sell(-quantity, price)
+            self.realized_pnl += realized
+        if book.quantity:
+            self.cost_basis[symbol] = book.cost_basis
+        else:
+            self.cost_basis.pop(symbol, None)
+        return {
+            "symbol": symbol,
+            "quantity": book.quantity,
+            "cost_basis": book.cost_basis,
+            "realized_pnl": book.realized_pnl,
+            "lots": [lot.row() for lot in changed],
+            "closed_lots": closed,
+        }
+
+    def rebuild_aggregates(self):
+        """ Recompute the lots and trade aggregates by replaying the whole ledger, and persist them. """
+        self.net_invested, self.realized_pnl, self.cost_basis = 0.0, 0.0, {}
+        self._lot_books = {}
+        positions = {}
+        for symbol, quantity, price, timestamp, _ in self.transactions:
+            book = self._lot_books.setdefault(symbol, LotBook(TAX_LOT_POLICY))
+            positions[symbol] = self.apply_to_aggregates(symbol, quantity, price, timestamp, book)
+        for symbol, position in positions.items():
+            position["lots"] = [lot.row() for lot in self._lot_books[symbol].lots]
+        write_aggregates(self.name, self.net_invested, self.realized_pnl, list(positions.values()), TAX_LOT_POLICY)
+
+    def record_trade(self, transaction: Transaction):
+        """ Append a transaction and its event to the ledger along with the resulting position, lots, balance and aggregates. """
+        position = self.apply_to_aggregates(
+            transaction.symbol,
+            transaction.quantity,
+            transaction.price,
+            transaction.timestamp,
+            self.lot_book(transaction.symbol),
+        )
+        if self._transactions is not None:
+            self._transactions.append(transaction)
+        write_trade(self.name, self.balance, transaction.model_dump(), position, self.net_invested, self.realized_pnl)
+        self.record_event("trade", symbol=transaction.symbol, quantity=transaction.quantity, price=transaction.price)
 
     def deposit(self, amount: float):
         """ Deposit funds into the account. """
         if amount <= 0:
             raise ValueError("Deposit amount must be positive.")
-        self.balance += amount
+        with self.unit_of_work():
+            self.reload()
+            self.balance += amount
+            self.save()
+            self.record_event("deposit", amount=amount)
         print(f"Deposited ${amount}. New balance: ${self.balance}")
-        self.save()
 
     def withdraw(self, amount: float):
         """ Withdraw funds from the account, ensuring it doesn't go negative. """
-        if amount > self.balance:
-            raise ValueError("Insufficient funds for withdrawal.")
-        self.balance -= amount
+        with self.unit_of_work():
+            self.reload()
+            if amount > self.balance:
+                raise ValueError("Insufficient funds for withdrawal.")
+            self.balance -= amount
+            self.save()
+            self.record_event("withdraw", amount=amount)
         print(f"Withdrew ${amount}. New balance: ${self.balance}")
-        self.save()
 
-    def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
-        """ Buy shares of a stock if sufficient funds are available. """
-        price = get_share_price(symbol)
+    def apply_buy(self, symbol: str, quantity: int, price: float, rationale: str):
+        """ Record a validated purchase at the given market price; call within a unit of work. """
         buy_price = price * (1 + SPREAD)
-        total_cost = buy_price * quantity
-        
-        if total_cost > self.balance:
-            raise ValueError("Insufficient funds to buy shares.")
-        elif price==0:
-            raise ValueError(f"Unrecognized symbol {symbol}")
-        
         # Update holdings
         self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
         transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
-        
+
         # Update balance
-        self.balance -= total_cost
-        self.save()
+        self.balance -= buy_price * quantity
+        self.record_trade(transaction)
         write_log(self.name, "account", f"Bought {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
 
-    def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
-        """ Sell shares of a stock if the user has enough shares. """
-        if self.holdings.get(symbol, 0) < quantity:
-            raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
-        
-        price = get_share_price(symbol)
+    def apply_sell(self, symbol: str, quantity: int, price: float, rationale: str):
+        """ Record a validated sale at the given market price; call within a unit of work. """
         sell_price = price * (1 - SPREAD)
-        total_proceeds = sell_price * quantity
-        
         # Update holdings
         self.holdings[symbol] -= quantity
-        
+
         # If shares are completely sold, remove from holdings
         if self.holdings[symbol] == 0:
             del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = clock.now().strftime("%Y-%m-%d %H:%M:%S")
         # Record transaction
         transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
-        self.transactions.append(transaction)
 
         # Update balance
-        self.balance += total_proceeds
-        self.save()
+        self.balance += sell_price * quantity
+        self.record_trade(transaction)
         write_log(self.name, "account", f"Sold {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
 
-    def calculate_portfolio_value(self):
-        """ Calculate the total value of the user's portfolio. """
+    def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        """ Buy shares of a stock if sufficient funds are available. """
+        # One batch for the trade and the report that follows, fetched before the write lock is taken
+        prices = get_share_prices([symbol, *self.holdings])
+        price = prices[symbol]
+        if price == 0:
+            raise ValueError(f"Unrecognized symbol {symbol}")
+
+        with self.unit_of_work():
+            self.reload()
+            if price * (1 + SPREAD) * quantity > self.balance:
+                raise ValueError("Insufficient funds to buy shares.")
+            self.apply_buy(symbol, quantity, price, rationale)
+            return "Completed. Latest details:\n" + self.report(self.known_prices(prices))
+
+    def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
+        """ Sell shares of a stock if the user has enough shares. """
+        prices = get_share_prices([symbol, *self.holdings])
+        with self.unit_of_work():
+            self.reload()
+            if self.holdings.get(symbol, 0) < quantity:
+                raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
+            self.apply_sell(symbol, quantity, prices[symbol], rationale)
+            return "Completed. Latest details:\n" + self.report(self.known_prices(prices))
+
+    def submit_orders(self, orders: list[Order], rationale: str) -> str:
+        """
+        Execute a batch of orders together: every order is checked against one snapshot of prices,
+        sells before buys so that their proceeds can pay for the buys, and either all of them are
+        executed in a single commit, with one report, or none are.
+        """
+        prices = get_share_prices([*(order.symbol for order in orders), *self.holdings])
+        ordered = [order for order in orders if order.side == "sell"] + [order for order in orders if order.side == "buy"]
+
+        with self.unit_of_work():
+            self.reload()
+            self.check_orders(ordered, prices)
+            for order in ordered:
+                apply = self.apply_sell if order.side == "sell" else self.apply_buy
+                apply(order.symbol, order.quantity, prices[order.symbol], rationale)
+            return "Completed. Latest details:\n" + self.report(self.known_prices(prices))
+
+    def check_orders(self, ordered: list[Order], prices: dict[str, float]) -> None:
+        """ Raise if any of the orders, taken in turn, could not be executed. """
+        holdings, balance, problems = dict(self.holdings), self.balance, []
+        for order in ordered:
+            symbol, quantity, price = order.symbol, order.quantity, prices[order.symbol]
+            if quantity <= 0:
+                problems.append(f"The quantity to {order.side} of {symbol} must be positive.")
+            elif price == 0:
+                problems.append(f"Unrecognized symbol {symbol}.")
+            elif order.side == "sell":
+                if holdings.get(symbol, 0) < quantity:
+                    problems.append(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
+                else:
+                    holdings[symbol] -= quantity
+                    balance += price * (1 - SPREAD) * quantity
+            elif price * (1 + SPREAD) * quantity > balance:
+                problems.append(f"Insufficient funds to buy {quantity} shares of {symbol}.")
+            else:
+                holdings[symbol] = holdings.get(symbol, 0) + quantity
+                balance -= price * (1 + SPREAD) * quantity
+        if problems:
+            raise ValueError("No orders were executed. " + " ".join(problems))
+
+    def known_prices(self, prices: dict[str, float]) -> dict[str, float]:
+        """
+        The given prices, plus a price for every other holding without fetching: the last one
+        seen on this host, or else the holding's average cost. For a unit of work, where a reload
+        may have brought in symbols that were not fetched before the write lock was taken.
+        """
+        if missing := [symbol for symbol in self.holdings if symbol not in prices]:
+            cached = get_cached_share_prices(missing)
+            prices = {**prices}
+            for symbol in missing:
+                prices[symbol] = cached.get(symbol) or self.cost_basis.get(symbol, 0.0) / self.holdings[symbol]
+        return prices
+
+    def calculate_portfolio_value(self, prices: dict[str, float] | None = None):
+        """ Calculate the total value of the user's portfolio, fetching any prices not given. """
         total_value = self.balance
+        prices = prices or {}
+        if missing := [symbol for symbol in self.holdings if symbol not in prices]:
+            prices = {**prices, **get_share_prices(missing)}
         for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
+            total_value += prices[symbol] * quantity
         return total_value
 
-    def calculate_profit_loss(self, portfolio_value: float):
+    def calculate_profit_loss(self, portfolio_value: float | None = None):
         """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        if portfolio_value is None:
+            portfolio_value = self.calculate_portfolio_value()
+        return portfolio_value - self.net_invested - self.balance
+
+    def calculate_unrealized_profit_loss(self, portfolio_value: float):
+        """ Calculate the profit or loss on the shares still held, against their cost basis. """
+        return portfolio_value - self.balance - sum(self.cost_basis.values())
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
@@ -146,20 +448,76 @@ class Account(BaseModel):
         """ Report the user's profit or loss at any point in time. """
         return self.calculate_profit_loss()
 
+    def get_positions(self) -> list[dict]:
+        """ Report each position's open lots, cost basis, and realized and unrealized profit or loss. """
+        prices = get_share_prices(self.holdings)
+        summaries = read_positions(self.name)
+        positions = []
+        for symbol in sorted(set(self.holdings) | set(summaries)):
+            quantity = self.holdings.get(symbol, 0)
+            cost_basis = self.cost_basis.get(symbol, 0.0)
+            market_value = prices.get(symbol, 0.0) * quantity
+            summary = summaries.get(symbol, {})
+            positions.append({
+                "symbol": symbol,
+                "quantity": quantity,
+                "average_cost": cost_basis / quantity if quantity else 0.0,
+                "cost_basis": cost_basis,
+                "price": prices.get(symbol),
+                "market_value": market_value,
+                "unrealized_pnl": market_value - cost_basis if quantity else 0.0,
+                "realized_pnl": summary.get("realized_pnl", 0.0),
+                "open_lots": summary.get("open_lots", 0),
+                "oldest_lot": summary.get("oldest_lot"),
+            })
+        write_log(self.name, "account", f"Retrieved positions")
+        return positions
+
+    def portfolio_value_summary(self) -> dict:
+        """ A bounded summary of the portfolio value history: its range and the latest few values. """
+        series = self.portfolio_value_time_series
+        if not series:
+            return {"points": 0}
+        values = [value for _, value in series]
+        return {
+            "points": len(series),
+            "first": series[0],
+            "high": max(values),
+            "low": min(values),
+            "recent": series[-REPORT_RECENT_VALUES:],
+        }
+
+    def recent_transactions(self, limit: int = REPORT_RECENT_TRANSACTIONS) -> tuple[int, list[dict]]:
+        """ How many transactions the account has made, and the latest few, without loading the whole history. """
+        if self._transactions is not None:
+            count, rows = len(self._transactions), self._transactions.rows[len(self._transactions) - limit:]
+        else:
+            count, rows = read_recent_transactions(self.name, limit)
+        return count, TRANSACTION_LIST.dump_python(TransactionHistory(rows).models())
+
     def list_transactions(self):
         """ List all transactions made by the user. """
-        return [transaction.model_dump() for transaction in self.transactions]
+        return TRANSACTION_LIST.dump_python(self.transactions.models())
     
-    def report(self) -> str:
-        """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
+    def report(self, prices: dict[str, float] | None = None) -> str:
+        """ Return a json string representing the account, valued at the given prices where there are some. """
+        portfolio_value = self.calculate_portfolio_value(prices)
+        now = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.unit_of_work():
+            recorded = write_portfolio_value(self.name, now, portfolio_value)
+            compacted = compact_portfolio_values(self.name, now)
+            write_log(self.name, "account", f"Retrieved account details")
+        if compacted:
+            self._portfolio_value_time_series = None
+        elif recorded and self._portfolio_value_time_series is not None:
+            self._portfolio_value_time_series.append((now, portfolio_value))
         pnl = self.calculate_profit_loss(portfolio_value)
         data = self.model_dump()
+        data["transaction_count"], data["recent_transactions"] = self.recent_transactions()
+        data["portfolio_value_summary"] = self.portfolio_value_summary()
         data["total_portfolio_value"] = portfolio_value
         data["total_profit_loss"] = pnl
-        write_log(self.name, "account", f"Retrieved account details")
+        data["unrealized_profit_loss"] = self.calculate_unrealized_profit_loss(portfolio_value)
         return json.dumps(data)
     
     def get_strategy(self) -> str:
@@ -169,9 +527,12 @@ class Account(BaseModel):
     
     def change_strategy(self, strategy: str) -> str:
         """ At your discretion, if you choose to, call this to change your investment strategy for the future """
-        self.strategy = strategy
-        self.save()
-        write_log(self.name, "account", f"Changed strategy")
+        with self.unit_of_work():
+            self.reload()
+            self.strategy = strategy
+            self.save()
+            self.record_event("strategy", strategy=strategy)
+            write_log(self.name, "account", f"Changed strategy")
         return "Changed strategy"
 
 # Example of usage:
@@ -1,39 +1,200 @@
+import asyncio
+import itertools
+import os
+import time
+from datetime import timedelta
+import anyio
 import mcp
 from mcp.client.stdio import stdio_client
+from mcp.client.sse import sse_client
+from mcp.client.streamable_http import streamablehttp_client
 from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
 from agents import FunctionTool
+from dotenv import load_dotenv
+from database import DB
+from mcp_transport import ACCOUNTS_SERVER_URL, is_sse_url
 import json
 
-params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
+load_dotenv(override=True)
+
+params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env={"ACCOUNTS_DB": DB})
+# The shared accounts server over HTTP when there is one, else a server of our own over stdio
+server = ACCOUNTS_SERVER_URL or params
+
+# How many sessions to the accounts server stay open; requests take turns across them
+ACCOUNTS_CLIENT_POOL_SIZE = int(os.getenv("ACCOUNTS_CLIENT_POOL_SIZE", "2"))
+# A session left idle for longer than this is pinged before it is used again
+HEALTH_CHECK_SECONDS = float(os.getenv("ACCOUNTS_CLIENT_HEALTH_CHECK_SECONDS", "30"))
+PING_TIMEOUT_SECONDS = 5
+REQUEST_TIMEOUT_SECONDS = 120
+
+
+def open_transport(server: StdioServerParameters | str):
+    """The client streams to a server: spawned over stdio, or at a streamable HTTP or SSE url"""
+    if not isinstance(server, str):
+        return stdio_client(server)
+    return sse_client(server) if is_sse_url(server) else streamablehttp_client(server)
+
+
+class PooledSession:
+    """
+    One initialized client session to an MCP server. The transport must be entered and left in
+    the same task, so a background task holds it open until the session is closed or the
+    server goes away.
+    """
+
+    def __init__(self, server: StdioServerParameters | str):
+        self.server = server
+        self.session: mcp.ClientSession | None = None
+        self.last_used = 0.0
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        self._error = None
+        self._task = None
+
+    async def open(self) -> "PooledSession":
+        self._task = asyncio.create_task(self._hold())
+        await self._ready.wait()
+        if self.session is None:
+            raise ConnectionError(f"Could not connect to the MCP server {self.server}: {self._error}")
+        return self
+
+    async def _hold(self) -> None:
+        try:
+            async with open_transport(self.server) as streams:
+                # The streamable HTTP client also yields a way to read its session id
+                read_stream, write_stream = streams[:2]
+                async with mcp.ClientSession(
+                    read_stream, write_stream, read_timeout_seconds=timedelta(seconds=REQUEST_TIMEOUT_SECONDS)
+                ) as session:
+                    await session.initialize()
+                    self.session = session
+                    self.last_used = time.monotonic()
+                    self._ready.set()
+                    await self._closing.wait()
+        except Exception as e:
+            self._error = e
+        finally:
+            self.session = None
+            self._ready.set()
+
+    async def healthy(self) -> bool:
+        """Open and, if it has been idle a while, answering pings"""
+        if self.session is None or self._task.done():
+            return False
+        if time.monotonic() - self.last_used < HEALTH_CHECK_SECONDS:
+            return True
+        try:
+            await asyncio.wait_for(self.session.send_ping(), PING_TIMEOUT_SECONDS)
+        except Exception:
+            return False
+        self.last_used = time.monotonic()
+        return True
+
+    async def close(self) -> None:
+        self._closing.set()
+        if self._task and not self._task.done():
+            await asyncio.wait([self._task], timeout=PING_TIMEOUT_SECONDS)
+
+
+class SessionPool:
+    """
+    Long-lived sessions to one MCP server, opened on first use and reused across calls, so a
+    request costs a round trip instead of a process spawn and handshake. Sessions that have
+    died are replaced, and the server's tool list is fetched once.
+    """
+
+    def __init__(self, server: StdioServerParameters | str, size: int = ACCOUNTS_CLIENT_POOL_SIZE):
+        self.server = server
+        self.size = max(size, 1)
+        self.sessions: list[PooledSession | None] = []
+        self.reconnects = 0
+        self.tools = None
+        self._turn = itertools.count()
+        self._locks: list[asyncio.Lock] = []
+        self._loop = None
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Sessions opened under an earlier event loop ended with it
+            self._loop = loop
+            self.sessions = [None] * self.size
+            self._locks = [asyncio.Lock() for _ in range(self.size)]
+
+    async def _acquire(self) -> tuple[int, PooledSession]:
+        self._bind_loop()
+        slot = next(self._turn) % self.size
+        async with self._locks[slot]:
+            pooled = self.sessions[slot]
+            if pooled is None or not await pooled.healthy():
+                if pooled is not None:
+                    self.reconnects += 1
+                    await pooled.close()
+                pooled = self.sessions[slot] = await PooledSession(self.server).open()
+            return slot, pooled
+
+    def _discard(self, slot: int, pooled: PooledSession) -> None:
+        if self.sessions[slot] is pooled:
+            self.sessions[slot] = None
+            self.reconnects += 1
+            asyncio.create_task(pooled.close())
+
+    async def request(self, send, idempotent: bool = True):
+        """
+        Call send(session) on a pooled session. If the session turns out to be dead, the call is
+        made again on a new one, unless it is not idempotent and may already have reached the server.
+        """
+        slot, pooled = await self._acquire()
+        try:
+            result = await send(pooled.session)
+            pooled.last_used = time.monotonic()
+            return result
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            # The request was never written, as the session had already closed
+            self._discard(slot, pooled)
+        except McpError as e:
+            if e.error.code != CONNECTION_CLOSED:
+                raise
+            self._discard(slot, pooled)
+            if not idempotent:
+                raise
+        slot, pooled = await self._acquire()
+        return await send(pooled.session)
+
+    async def list_tools(self):
+        if self.tools is None:
+            self.tools = (await self.request(lambda session: session.list_tools())).tools
+        return self.tools
+
+    async def close(self) -> None:
+        sessions = [pooled for pooled in self.sessions if pooled is not None]
+        self.sessions = [None] * self.size
+        await asyncio.gather(*[pooled.close() for pooled in sessions])
+
+
+accounts_pool = SessionPool(server)
 
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    return await accounts_pool.list_tools()
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    # Tools such as buy_shares must not be repeated if the server went away mid-call
+    return await accounts_pool.request(lambda session: session.call_tool(tool_name, tool_args), idempotent=False)
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    result = await accounts_pool.request(lambda session: session.read_resource(f"accounts://accounts_server/{name}"))
+    return result.contents[0].text
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    result = await accounts_pool.request(lambda session: session.read_resource(f"accounts://strategy/{name}"))
+    return result.contents[0].text
+
+async def close_accounts_client():
+    await accounts_pool.close()
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +205,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
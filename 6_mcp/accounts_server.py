@@ -1,8 +1,22 @@
+import asyncio
+import json
+from collections import defaultdict
 from mcp.server.fastmcp import FastMCP
-from accounts import Account
+from accounts import Account, Order
+import orders as order_book
+from analytics import portfolio_metrics
+from mcp_transport import serve, ACCOUNTS_SERVER_PORT
 
 mcp = FastMCP("accounts_server")
 
+# A shared HTTP server takes requests from every trader at once, so account work runs on worker
+# threads to keep the event loop free; each account's calls still run one at a time, as over stdio
+_account_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+async def for_account(name: str, call):
+    async with _account_locks[name.lower()]:
+        return await asyncio.to_thread(call)
+
 @mcp.tool()
 async def get_balance(name: str) -> float:
     """Get the cash balance of the given account name.
@@ -10,7 +24,7 @@ async def get_balance(name: str) -> float:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).balance
+    return await for_account(name, lambda: Account.get(name).balance)
 
 @mcp.tool()
 async def get_holdings(name: str) -> dict[str, int]:
@@ -19,7 +33,17 @@ async def get_holdings(name: str) -> dict[str, int]:
     Args:
         name: The name of the account holder
     """
-    return Account.get(name).holdings
+    return await for_account(name, lambda: Account.get(name).holdings)
+
+@mcp.tool()
+async def get_positions(name: str) -> list[dict]:
+    """Get each position of the given account name, with its tax lot policy's cost basis,
+    unrealized profit or loss at the current price, and realized profit or loss to date.
+
+    Args:
+        name: The name of the account holder
+    """
+    return await for_account(name, lambda: Account.get(name).get_positions())
 
 @mcp.tool()
 async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> float:
@@ -31,7 +55,7 @@ async def buy_shares(name: str, symbol: str, quantity: int, rationale: str) -> f
         quantity: The quantity of shares to buy
         rationale: The rationale for the purchase and fit with the account's strategy
     """
-    return Account.get(name).buy_shares(symbol, quantity, rationale)
+    return await for_account(name, lambda: Account.get(name).buy_shares(symbol, quantity, rationale))
 
 
 @mcp.tool()
@@ -44,7 +68,57 @@ async def sell_shares(name: str, symbol: str, quantity: int, rationale: str) ->
         quantity: The quantity of shares to sell
         rationale: The rationale for the sale and fit with the account's strategy
     """
-    return Account.get(name).sell_shares(symbol, quantity, rationale)
+    return await for_account(name, lambda: Account.get(name).sell_shares(symbol, quantity, rationale))
+
+@mcp.tool()
+async def submit_orders(name: str, orders: list[Order], rationale: str) -> str:
+    """Buy and sell several stocks in one call, such as to rebalance a portfolio.
+    Sells are executed before buys so that their proceeds can fund the buys; if any order
+    can't be filled, none of them are executed.
+
+    Args:
+        name: The name of the account holder
+        orders: The orders, each with a symbol, a side of "buy" or "sell", and a quantity of shares
+        rationale: The rationale for these trades and fit with the account's strategy
+    """
+    return await for_account(name, lambda: Account.get(name).submit_orders(orders, rationale))
+
+@mcp.tool()
+async def place_order(name: str, symbol: str, side: str, kind: str, quantity: int, price: float, rationale: str) -> str:
+    """Place a resting limit or stop order, which is filled automatically when the price reaches it.
+    A buy limit fills at or below its price and a sell limit at or above it; a buy stop triggers
+    once the price rises to its price and a sell stop once it falls to it, then fills at market.
+
+    Args:
+        name: The name of the account holder
+        symbol: The symbol of the stock
+        side: "buy" or "sell"
+        kind: "limit" or "stop"
+        quantity: The quantity of shares
+        price: The limit or stop price
+        rationale: The rationale for the order and fit with the account's strategy
+    """
+    return await for_account(name, lambda: order_book.place_order(name, symbol, side, kind, quantity, price, rationale))
+
+@mcp.tool()
+async def cancel_order(name: str, order_id: int) -> str:
+    """Cancel an open limit or stop order.
+
+    Args:
+        name: The name of the account holder
+        order_id: The id of the order, as returned when it was placed
+    """
+    return await for_account(name, lambda: order_book.cancel_order(name, order_id))
+
+@mcp.tool()
+async def list_orders(name: str, status: str = "open") -> list[dict]:
+    """List the account's most recent limit and stop orders.
+
+    Args:
+        name: The name of the account holder
+        status: Only list orders with this status: open, filled, cancelled or rejected
+    """
+    return await for_account(name, lambda: order_book.list_orders(name, status))
 
 @mcp.tool()
 async def change_strategy(name: str, strategy: str) -> str:
@@ -54,17 +128,20 @@ async def change_strategy(name: str, strategy: str) -> str:
         name: The name of the account holder
         strategy: The new strategy for the account
     """
-    return Account.get(name).change_strategy(strategy)
+    return await for_account(name, lambda: Account.get(name).change_strategy(strategy))
 
 @mcp.resource("accounts://accounts_server/{name}")
 async def read_account_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.report()
+    return await for_account(name, lambda: Account.get(name.lower()).report())
 
 @mcp.resource("accounts://strategy/{name}")
 async def read_strategy_resource(name: str) -> str:
-    account = Account.get(name.lower())
-    return account.get_strategy()
+    return await for_account(name, lambda: Account.get(name.lower()).get_strategy())
+
+@mcp.resource("accounts://analytics")
+async def read_analytics_resource() -> str:
+    return json.dumps(await asyncio.to_thread(portfolio_metrics))
 
 if __name__ == "__main__":
-    mcp.run(transport='stdio')
\ No newline at end of file
+    order_book.start_order_matching()
+    serve(mcp, ACCOUNTS_SERVER_PORT)
\ No newline at end of file
@@ -0,0 +1,219 @@
+import os
+import threading
+from datetime import date, datetime, timezone
+import numpy as np
+from dotenv import load_dotenv
+from database import (
+    read_all_portfolio_values,
+    latest_portfolio_value_id,
+    read_balances,
+    read_symbol_closes,
+)
+from market import polygon_api_key, use_market_simulator
+from polygon_client import polygon_client
+from simulator import MarketSimulator, EXCHANGE_TZ, TRADING_DAYS_PER_YEAR
+
+load_dotenv(override=True)
+
+# Annual risk-free rate that Sharpe and Sortino ratios are measured against
+RISK_FREE_RATE = float(os.getenv("RISK_FREE_RATE", "0.0"))
+# The confidence of the one-day historical value at risk
+VAR_CONFIDENCE = float(os.getenv("VAR_CONFIDENCE", "0.95"))
+BENCHMARK_SYMBOL = os.getenv("BENCHMARK_SYMBOL", "SPY")
+
+METRICS = (
+    "days",
+    "total_return",
+    "volatility",
+    "sharpe",
+    "sortino",
+    "max_drawdown",
+    "current_drawdown",
+    "beta",
+    "value_at_risk",
+    "value_at_risk_dollars",
+    "cash_weight",
+)
+
+
+def daily_value_matrix(rows) -> tuple[list[str], list[str], np.ndarray]:
+    """
+    Align every account's portfolio values on one calendar of days.
+
+    Each account's value for a day is the last one recorded that day, carried forward over days
+    with no record; days before an account's first record are NaN.
+
+    Returns:
+        tuple: The account names, the days as YYYY-MM-DD, and a (names, days) array of values
+    """
+    last_by_day: dict[str, dict[str, float]] = {}
+    for name, when, value in rows:
+        last_by_day.setdefault(name, {})[when[:10]] = value
+    names = sorted(last_by_day)
+    days = sorted({day for values in last_by_day.values() for day in values})
+    column = {day: i for i, day in enumerate(days)}
+    values = np.full((len(names), len(days)), np.nan)
+    for row, name in enumerate(names):
+        for day, value in last_by_day[name].items():
+            values[row, column[day]] = value
+    recorded = np.where(np.isnan(values), -1, np.arange(len(days)))
+    np.maximum.accumulate(recorded, axis=1, out=recorded)
+    filled = np.take_along_axis(values, np.maximum(recorded, 0), axis=1)
+    filled[recorded < 0] = np.nan
+    return names, days, filled
+
+
+def returns(values: np.ndarray) -> np.ndarray:
+    """Simple returns along the last axis, NaN where either end is missing"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return values[..., 1:] / values[..., :-1] - 1
+
+
+def risk_metrics(values: np.ndarray, benchmark: np.ndarray, cash: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Compute every metric for every account at once.
+
+    Args:
+        values: (accounts, days) daily portfolio values
+        benchmark: (days,) daily closes of the benchmark, NaN where unknown
+        cash: (accounts,) current cash balances
+    """
+    daily = returns(values)
+    market = returns(benchmark)[None, :]
+    rf = RISK_FREE_RATE / TRADING_DAYS_PER_YEAR
+    excess = daily - rf
+    observed = ~np.isnan(daily)
+    count = observed.sum(axis=1)
+    enough = count > 1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(enough, np.nansum(excess, axis=1) / count, np.nan)
+        deviation = np.where(observed, excess - mean[:, None], 0)
+        std = np.sqrt((deviation**2).sum(axis=1) / (count - 1))
+        downside = np.sqrt((np.minimum(np.where(observed, excess, 0), 0) ** 2).sum(axis=1) / count)
+        annual = np.sqrt(TRADING_DAYS_PER_YEAR)
+
+        peak = np.fmax.accumulate(values, axis=1)
+        drawdown = values / peak - 1
+        first = np.argmax(~np.isnan(values), axis=1)
+        start = values[np.arange(len(values)), first]
+        latest = values[:, -1]
+
+        paired = observed & ~np.isnan(market)
+        pairs = paired.sum(axis=1)
+        r = np.where(paired, daily, 0)
+        m = np.where(paired, market, 0)
+        r_centred = np.where(paired, r - r.sum(axis=1, keepdims=True) / pairs[:, None], 0)
+        m_centred = np.where(paired, m - m.sum(axis=1, keepdims=True) / pairs[:, None], 0)
+        beta = (r_centred * m_centred).sum(axis=1) / (m_centred**2).sum(axis=1)
+
+        tail = np.full(len(values), np.nan)
+        if daily.shape[1]:
+            tail = -np.nanpercentile(np.where(observed, daily, np.nan), (1 - VAR_CONFIDENCE) * 100, axis=1)
+
+        return {
+            "days": count + 1,
+            "total_return": latest / start - 1,
+            "volatility": np.where(enough, std * annual, np.nan),
+            "sharpe": np.where(enough, mean / std * annual, np.nan),
+            "sortino": np.where(enough, mean / downside * annual, np.nan),
+            "max_drawdown": np.nanmin(np.where(np.isnan(drawdown), np.inf, drawdown), axis=1),
+            "current_drawdown": drawdown[:, -1],
+            "beta": np.where(pairs > 1, beta, np.nan),
+            "value_at_risk": np.where(enough, tail, np.nan),
+            "value_at_risk_dollars": np.where(enough, tail * latest, np.nan),
+            "cash_weight": cash / latest,
+        }
+
+
+class BenchmarkCloses:
+    """
+    Daily closes of the benchmark, from stored end-of-day markets, then Polygon, then the market
+    simulator. Past closes never change, so each day is looked up once.
+    """
+
+    def __init__(self, symbol: str = BENCHMARK_SYMBOL):
+        self.symbol = symbol
+        self.closes: dict[str, float] = {}
+        self.simulator = None
+
+    def _from_polygon(self, days: list[str]) -> dict[str, float]:
+        aggs = polygon_client().call("get_aggs", self.symbol, 1, "day", days[0], days[-1])
+        closes = {}
+        for agg in aggs:
+            day = datetime.fromtimestamp(agg.timestamp / 1000, tz=timezone.utc).astimezone(EXCHANGE_TZ).date()
+            closes[day.isoformat()] = agg.close
+        return closes
+
+    def _from_simulator(self, days: list[str]) -> dict[str, float]:
+        if self.simulator is None:
+            self.simulator = MarketSimulator()
+        return {
+            day: float(self.simulator.closes([self.symbol], date.fromisoformat(day))[0])
+            for day in days
+            if np.is_busday(day)
+        }
+
+    def get(self, days: list[str]) -> np.ndarray:
+        today = datetime.now(EXCHANGE_TZ).date().isoformat()
+        missing = [day for day in days if day not in self.closes]
+        if missing:
+            found = read_symbol_closes(self.symbol, missing)
+            rest = [day for day in missing if day not in found]
+            if rest and polygon_api_key and not use_market_simulator:
+                try:
+                    found |= self._from_polygon(rest)
+                except Exception as e:
+                    print(f"Was not able to fetch {self.symbol} closes from polygon due to {e}")
+            elif rest:
+                found |= self._from_simulator(rest)
+            # Today's close isn't final, so it is looked up again next time
+            self.closes |= {day: close for day, close in found.items() if day < today}
+            lookup = self.closes | found
+        else:
+            lookup = self.closes
+        return np.array([lookup.get(day, np.nan) for day in days])
+
+
+class RiskAnalytics:
+    """
+    Risk metrics for every account, computed together over aligned NumPy arrays, and cached
+    until another portfolio value is recorded.
+    """
+
+    def __init__(self):
+        self.benchmark = BenchmarkCloses()
+        self._key = None
+        self._metrics: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def metrics(self) -> dict[str, dict]:
+        """Each account's metrics by name; NaN metrics, such as with too little history, are None"""
+        with self._lock:
+            key = latest_portfolio_value_id()
+            if key != self._key:
+                self._metrics = self._compute()
+                self._key = key
+            return self._metrics
+
+    def _compute(self) -> dict[str, dict]:
+        names, days, values = daily_value_matrix(read_all_portfolio_values())
+        if not names:
+            return {}
+        balances = read_balances()
+        cash = np.array([balances.get(name, np.nan) for name in names])
+        results = risk_metrics(values, self.benchmark.get(days), cash)
+        return {
+            name: {
+                metric: (None if np.isnan(value := float(results[metric][i])) or np.isinf(value) else value)
+                for metric in METRICS
+            }
+            for i, name in enumerate(names)
+        }
+
+
+risk_analytics = RiskAnalytics()
+
+
+def portfolio_metrics() -> dict[str, dict]:
+    return risk_analytics.metrics()
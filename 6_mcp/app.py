@@ -1,10 +1,12 @@
 import gradio as gr
+from collections import deque
 from util import css, js, Color
 import pandas as pd
 from trading_floor import names, lastnames, short_model_names
 import plotly.express as px
 from accounts import Account
-from database import read_log
+from database import read_log_since
+from analytics import portfolio_metrics, METRICS
 
 mapper = {
     "trace": Color.WHITE,
@@ -15,6 +17,8 @@ mapper = {
     "account": Color.RED,
 }
 
+LOG_LINES = 13
+
 
 class Trader:
     def __init__(self, name: str, lastname: str, model_name: str):
@@ -22,6 +26,9 @@ class Trader:
         self.lastname = lastname
         self.model_name = model_name
         self.account = Account.get(name)
+        self.logs = deque(maxlen=LOG_LINES)
+        self.last_log_id = 0
+        self.logs_html = None
 
     def reload(self):
         self.account = Account.get(self.name)
@@ -53,9 +60,10 @@ class Trader:
         fig.update_yaxes(tickfont=dict(size=8), tickformat=",.0f")
         return fig
 
-    def get_holdings_df(self) -> pd.DataFrame:
-        """Convert holdings to DataFrame for display"""
-        holdings = self.account.get_holdings()
+    def get_holdings_df(self, when: str | None = None) -> pd.DataFrame:
+        """Convert holdings, now or as they were at the given time, to DataFrame for display"""
+        account = Account.as_of(self.name, when) if when else self.account
+        holdings = account.get_holdings() if account else {}
         if not holdings:
             return pd.DataFrame(columns=["Symbol", "Quantity"])
 
@@ -81,15 +89,18 @@ class Trader:
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
     def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
-        response = ""
-        for log in logs:
-            timestamp, type, message = log
-            color = mapper.get(type, Color.WHITE).value
-            response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
-        if response != previous:
-            return response
+        new_logs = read_log_since(self.name, self.last_log_id, last_n=LOG_LINES)
+        for log_id, timestamp, type, message in new_logs:
+            self.last_log_id = log_id
+            self.logs.append((timestamp, type, message))
+        if new_logs or self.logs_html is None:
+            response = ""
+            for timestamp, type, message in self.logs:
+                color = mapper.get(type, Color.WHITE).value
+                response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
+            self.logs_html = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
+        if self.logs_html != previous:
+            return self.logs_html
         return gr.update()
 
 
@@ -165,6 +176,15 @@ class TraderView:
         )
 
 
+def get_metrics_df() -> pd.DataFrame:
+    """Risk metrics for every trader, one row each"""
+    metrics = portfolio_metrics()
+    rows = [{"Trader": name.title(), **values} for name, values in metrics.items()]
+    df = pd.DataFrame(rows, columns=["Trader", *METRICS])
+    df.columns = ["Trader", *[metric.replace("_", " ").title() for metric in METRICS]]
+    return df.round(3)
+
+
 # Main UI construction
 def create_ui():
     """Create the main Gradio UI for the trading simulation"""
@@ -181,6 +201,16 @@ def create_ui():
         with gr.Row():
             for trader_view in trader_views:
                 trader_view.make_ui()
+        with gr.Row():
+            metrics_table = gr.Dataframe(
+                value=get_metrics_df,
+                label="Risk",
+                headers=["Trader", *[metric.replace("_", " ").title() for metric in METRICS]],
+                max_height=300,
+                elem_classes=["dataframe-fix"],
+            )
+        metrics_timer = gr.Timer(value=120)
+        metrics_timer.tick(fn=get_metrics_df, inputs=[], outputs=[metrics_table], show_progress="hidden", queue=False)
 
     return ui
 
@@ -0,0 +1,217 @@
+"""
+Micro-benchmarks for the trading floor's storage and market data paths.
+
+Each benchmark runs against a throwaway database so it never touches accounts.db.
+Run with `uv run benchmarks.py` for all of them, or name the ones you want:
+`uv run benchmarks.py database`
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = tempfile.mkdtemp(prefix="bench_")
+os.environ["ACCOUNTS_DB"] = os.path.join(BENCH_DIR, "bench.db")
+os.environ["PRICE_CACHE_FILE"] = os.path.join(BENCH_DIR, "price_cache.bin")
+os.environ["MARKET_SIMULATOR"] = "true"
+
+import sqlite3
+import database
+from simulator import MarketSimulator
+
+OPS = 2000
+
+
+def ops_per_second(fn, ops: int = OPS) -> float:
+    start = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return ops / (time.perf_counter() - start)
+
+
+def per_call_write_log(i):
+    """The original behaviour: a fresh connection and a commit for every log line"""
+    with sqlite3.connect(database.DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO logs (name, datetime, type, message) VALUES (?, datetime('now'), ?, ?)",
+            ("bench", "trace", f"Started {i}"),
+        )
+        conn.commit()
+
+
+def per_call_read_account(i):
+    with sqlite3.connect(database.DB) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT balance, strategy FROM account_state WHERE name = ?", ("bench",))
+        cursor.fetchone()
+
+
+def bench_database():
+    database.write_account("bench", 10_000.0, "")
+    rows = [
+        ("write_log", per_call_write_log, lambda i: database.write_log("bench", "trace", f"Started {i}")),
+        ("read_account", per_call_read_account, lambda i: database.read_account("bench")),
+    ]
+    print(f"{'operation':<16}{'per-call ops/s':>18}{'pooled ops/s':>18}{'speedup':>10}")
+    for label, before, after in rows:
+        before_rate = ops_per_second(before)
+        after_rate = ops_per_second(after)
+        print(f"{label:<16}{before_rate:>18,.0f}{after_rate:>18,.0f}{after_rate / before_rate:>9.1f}x")
+
+
+def bench_market_cold_start(lookups: int = 200):
+    """
+    The first get_share_price in a freshly spawned MCP server process: previously a json.loads
+    of the whole ~10k symbol market blob, now a single primary-key lookup on the prices table
+    """
+    date = "2025-01-02"
+    market = {f"SYM{i:05d}": 100.0 + i / 100 for i in range(10_000)}
+    blob = json.dumps(market)
+    with sqlite3.connect(database.DB) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS legacy_market (date TEXT PRIMARY KEY, data TEXT)")
+        conn.execute("INSERT OR REPLACE INTO legacy_market VALUES (?, ?)", (date, blob))
+    database.write_market(date, market)
+
+    def blob_lookup(i):
+        with sqlite3.connect(database.DB) as conn:
+            data = json.loads(conn.execute("SELECT data FROM legacy_market WHERE date = ?", (date,)).fetchone()[0])
+        data.get(f"SYM{i % 10_000:05d}", 0.0)
+
+    def table_lookup(i):
+        database.close_connection()
+        database.read_market_price(date, f"SYM{i % 10_000:05d}")
+
+    before = 1000 / ops_per_second(blob_lookup, lookups)
+    after = 1000 / ops_per_second(table_lookup, lookups)
+    print(f"cold get_share_price: JSON blob {before:.2f} ms, prices table {after:.2f} ms ({before / after:.0f}x)")
+
+
+def bench_simulator(symbols: int = 5000):
+    simulator = MarketSimulator()
+    universe = [f"SYM{i:05d}" for i in range(symbols)]
+    start = time.perf_counter()
+    simulator.prices(universe)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    simulator.prices(universe)
+    again = time.perf_counter() - start
+    print(f"{symbols:,} simulated prices: first call {first * 1000:.0f} ms, cached paths {again * 1000:.1f} ms")
+
+
+def bench_account_tool_calls(calls: int = 200):
+    """Database commits made by each account tool call, which runs as one unit of work"""
+    from accounts import Account
+
+    Account.get("bench").reset("")
+    database.write_account("bench", 1e9, "")
+    tool_calls = [
+        ("buy_shares", lambda: Account.get("bench").buy_shares("AAPL", 1, "")),
+        ("sell_shares", lambda: Account.get("bench").sell_shares("AAPL", 1, "")),
+        ("report", lambda: Account.get("bench").report()),
+        ("change_strategy", lambda: Account.get("bench").change_strategy("")),
+    ]
+    print(f"{'tool call':<16}{'commits/call':>14}{'ms/call':>10}")
+    for label, call in tool_calls:
+        before = database.transaction_stats()["commits"]
+        start = time.perf_counter()
+        for _ in range(calls):
+            call()
+        elapsed = time.perf_counter() - start
+        commits = database.transaction_stats()["commits"] - before
+        print(f"{label:<16}{commits / calls:>14.1f}{elapsed * 1000 / calls:>10.2f}")
+
+
+def bench_account_history(lengths=(100, 1_000, 10_000, 50_000), repeats: int = 20):
+    """
+    Account.get latency against the length of the trade history, the cost of listing it, and
+    of a report, which every trade and account read makes
+    """
+    from accounts import Account, Transaction
+
+    def ms(fn) -> float:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        return (time.perf_counter() - start) * 1000 / repeats
+
+    def eager_get(name):
+        """The original behaviour: a validated Transaction model for every fill on every load"""
+        rows = database.read_transactions(name)
+        account = Account.get(name)
+        fields = ("symbol", "quantity", "price", "timestamp", "rationale")
+        return account, [Transaction(**dict(zip(fields, row))) for row in rows]
+
+    print(f"{'fills':>8}{'eager get ms':>15}{'lazy get ms':>14}{'list ms':>10}{'report ms':>12}")
+    for length in lengths:
+        name = f"history{length}"
+        Account.get(name)
+        with database.transaction() as conn:
+            conn.executemany(
+                database.INSERT_TRANSACTION,
+                [(name, "AAPL", 1 if i % 2 else -1, 100.0, "2025-01-02 10:00:00", "bench") for i in range(length)],
+            )
+        Account.get(name).rebuild_aggregates()
+        eager = ms(lambda: eager_get(name))
+        lazy = ms(lambda: Account.get(name).balance)
+        listed = ms(lambda: Account.get(name).list_transactions())
+        reported = ms(lambda: Account.get(name).report())
+        print(f"{length:>8,}{eager:>15.2f}{lazy:>14.2f}{listed:>10.2f}{reported:>12.2f}")
+
+
+def bench_accounts_client(calls: int = 20):
+    """Latency of reading an account resource through the MCP accounts server"""
+    import asyncio
+    import mcp
+    from mcp.client.stdio import stdio_client
+    import accounts_client
+    from accounts import Account
+
+    Account.get("bench")
+
+    async def one_shot():
+        """The original behaviour: a new server process and session for every request"""
+        async with stdio_client(accounts_client.params) as streams:
+            async with mcp.ClientSession(*streams) as session:
+                await session.initialize()
+                await session.read_resource("accounts://strategy/bench")
+
+    async def ms(fn) -> float:
+        start = time.perf_counter()
+        for _ in range(calls):
+            await fn()
+        return (time.perf_counter() - start) * 1000 / calls
+
+    async def compare():
+        before = await ms(one_shot)
+        # The first call on each of the pool's sessions spawns its server
+        first = time.perf_counter()
+        await asyncio.gather(
+            *[accounts_client.read_strategy_resource("bench") for _ in range(accounts_client.accounts_pool.size)]
+        )
+        first = (time.perf_counter() - first) * 1000
+        after = await ms(lambda: accounts_client.read_strategy_resource("bench"))
+        tools = await ms(accounts_client.list_accounts_tools)
+        await accounts_client.close_accounts_client()
+        print(f"one-shot session {before:.1f} ms/call, pooled {after:.2f} ms/call ({before / after:.0f}x)")
+        print(f"opening the pool {first:.1f} ms; cached list_tools {tools:.3f} ms")
+
+    asyncio.run(compare())
+
+
+BENCHMARKS = {
+    "database": bench_database,
+    "market": bench_market_cold_start,
+    "simulator": bench_simulator,
+    "account": bench_account_tool_calls,
+    "history": bench_account_history,
+    "client": bench_accounts_client,
+}
+
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        print(f"\n== {name} ==")
+        BENCHMARKS[name]()
@@ -0,0 +1,17 @@
+from datetime import datetime
+from database import read_clock, write_clock
+
+
+def now() -> datetime:
+    """The current time: the wall clock, or the simulated time when the database is a replay"""
+    simulated = read_clock()
+    return datetime.fromisoformat(simulated) if simulated else datetime.now()
+
+
+def is_simulated() -> bool:
+    return read_clock() is not None
+
+
+def set_simulated_now(when: datetime | None) -> None:
+    """Move the simulated clock that every process using this database will see; None to clear it"""
+    write_clock(when.isoformat() if when else None)
@@ -1,17 +1,279 @@
 import sqlite3
 import json
-from datetime import datetime
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 load_dotenv(override=True)
 
-DB = "accounts.db"
+# A replay (see trading_floor.py) runs against its own database, so live accounts are never touched
+DB = os.getenv("ACCOUNTS_DB") or (os.getenv("REPLAY_DB", "replay.db") if os.getenv("REPLAY_START") else "accounts.db")
 
+# How long a writer waits for another process to release the database lock before giving up
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
 
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
-    cursor.execute('''
+# Portfolio values are kept at full resolution for this many hours after the latest one, then
+# rolled up into hourly points, which are kept for this many days before becoming daily points
+PORTFOLIO_VALUE_FULL_HOURS = int(os.getenv("PORTFOLIO_VALUE_FULL_HOURS", "24"))
+PORTFOLIO_VALUE_HOURLY_DAYS = int(os.getenv("PORTFOLIO_VALUE_HOURLY_DAYS", "30"))
+
+# Prepared statements kept per connection; every query in this module is a constant string,
+# so sqlite3's statement cache hands back the already-compiled statement on each call
+STATEMENT_CACHE_SIZE = 128
+
+_local = threading.local()
+
+# Transactions committed and rolled back by this process, counting only the outermost of nested ones
+_transaction_stats = {"commits": 0, "rollbacks": 0}
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    # Lets log retention hand freed pages back to the filesystem with PRAGMA incremental_vacuum.
+    # It must come before journal_mode, which writes the header of a new database; an existing
+    # database keeps its mode until a full VACUUM
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return the long-lived connection for the current thread.
+
+    Connections are opened lazily, once per thread and per process, and are reopened after a
+    fork so that a child never shares a SQLite handle with its parent.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.depth = 0
+    return conn
+
+
+def close_connection() -> None:
+    """Close the current thread's connection, if one is open."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """
+    Run the enclosed statements as a single write transaction on the thread's connection.
+
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue on busy_timeout
+    instead of failing with 'database is locked' when a read lock is upgraded mid-transaction.
+
+    Transactions nest: one opened inside another becomes a savepoint of it, so everything written
+    within the outermost transaction (a unit of work such as one tool call) commits once, and an
+    inner failure that is caught undoes only the inner writes.
+    """
+    conn = get_connection()
+    depth = _local.depth
+    savepoint = f"nested_{depth}"
+    conn.execute(f"SAVEPOINT {savepoint}" if depth else "BEGIN IMMEDIATE")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        if depth:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        else:
+            conn.execute("ROLLBACK")
+            _transaction_stats["rollbacks"] += 1
+        raise
+    else:
+        if depth:
+            conn.execute(f"RELEASE {savepoint}")
+        else:
+            conn.execute("COMMIT")
+            _transaction_stats["commits"] += 1
+    finally:
+        _local.depth = depth
+
+
+def transaction_stats() -> dict[str, int]:
+    """The number of transactions this process has committed and rolled back"""
+    return dict(_transaction_stats)
+
+
+INSERT_TRANSACTION = '''
+    INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+INSERT_PORTFOLIO_VALUE = 'INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)'
+INSERT_LOT = 'INSERT OR REPLACE INTO lots (name, symbol, seq, quantity, price, opened_at) VALUES (?, ?, ?, ?, ?, ?)'
+INSERT_POSITION_PNL = 'INSERT OR REPLACE INTO position_pnl (name, symbol, realized_pnl) VALUES (?, ?, ?)'
+INSERT_PRICE = 'INSERT OR REPLACE INTO prices (date, symbol, close) VALUES (?, ?, ?)'
+UPSERT_ACCOUNT = '''
+    INSERT INTO account_state (name, balance, strategy, net_invested, realized_pnl, lot_policy)
+    VALUES (?, ?, ?, 0, 0, ?)
+    ON CONFLICT(name) DO UPDATE SET balance=excluded.balance, strategy=excluded.strategy
+'''
+
+
+def _migrate_account_blobs(conn: sqlite3.Connection) -> None:
+    """
+    Explode legacy whole-account JSON rows from the accounts table into the ledger tables.
+    A blob is authoritative for its account, so any ledger rows already present are replaced.
+    """
+    for name, blob in conn.execute('SELECT name, account FROM accounts').fetchall():
+        account = json.loads(blob)
+        for table in (
+            "account_state", "holdings", "transactions", "portfolio_values", "portfolio_value_rollups", "lots",
+            "position_pnl",
+        ):
+            conn.execute(f'DELETE FROM {table} WHERE name = ?', (name,))
+        conn.execute(UPSERT_ACCOUNT, (name, account["balance"], account.get("strategy", ""), None))
+        conn.executemany(
+            'INSERT INTO holdings (name, symbol, quantity) VALUES (?, ?, ?)',
+            [(name, symbol, quantity) for symbol, quantity in account.get("holdings", {}).items()],
+        )
+        conn.executemany(
+            INSERT_TRANSACTION,
+            [
+                (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+                for t in account.get("transactions", [])
+            ],
+        )
+        conn.executemany(
+            INSERT_PORTFOLIO_VALUE,
+            [(name, when, value) for when, value in account.get("portfolio_value_time_series", [])],
+        )
+        # The trade aggregates are rebuilt from the migrated ledger the next time the account is read
+        conn.execute('UPDATE account_state SET net_invested = NULL, realized_pnl = NULL WHERE name = ?', (name,))
+        conn.execute('DELETE FROM accounts WHERE name = ?', (name,))
+
+
+def _snapshot_accounts_without_events(conn: sqlite3.Connection) -> None:
+    """Give accounts that predate the event ledger a baseline snapshot of their current state"""
+    conn.execute('''
+        INSERT INTO account_snapshots (name, event_id, datetime, state)
+        SELECT a.name, 0, ?, json_object(
+            'balance', a.balance,
+            'strategy', a.strategy,
+            'holdings', json((SELECT json_group_object(symbol, quantity) FROM holdings h WHERE h.name = a.name))
+        )
+        FROM account_state a
+        WHERE NOT EXISTS (SELECT 1 FROM account_events e WHERE e.name = a.name)
+        AND NOT EXISTS (SELECT 1 FROM account_snapshots s WHERE s.name = a.name)
+    ''', (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, declaration: str) -> None:
+    """Add a column to a table created before the column existed; existing rows get NULL"""
+    if column not in [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {declaration}')
+
+
+def _migrate_market_blobs(conn: sqlite3.Connection) -> None:
+    """Explode legacy whole-market JSON rows from the market table into one price row per symbol"""
+    for date, blob in conn.execute('SELECT date, data FROM market').fetchall():
+        conn.executemany(INSERT_PRICE, [(date, symbol, close) for symbol, close in json.loads(blob).items()])
+        conn.execute('DELETE FROM market WHERE date = ?', (date,))
+
+
+with transaction() as conn:
+    # Legacy whole-account JSON blobs; kept only so that old rows can be migrated on startup
+    conn.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS account_state (
+            name TEXT PRIMARY KEY,
+            balance REAL,
+            strategy TEXT,
+            net_invested REAL,
+            realized_pnl REAL,
+            lot_policy TEXT
+        )
+    ''')
+    # Running trade aggregates; NULL marks an account whose aggregates must be rebuilt from the ledger
+    _add_column(conn, "account_state", "net_invested", "REAL")
+    _add_column(conn, "account_state", "realized_pnl", "REAL")
+    # The tax lot policy the lots were built under; they are rebuilt if the configured one differs
+    _add_column(conn, "account_state", "lot_policy", "TEXT")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holdings (
+            name TEXT,
+            symbol TEXT,
+            quantity INTEGER,
+            cost_basis REAL,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    _add_column(conn, "holdings", "cost_basis", "REAL")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lots (
+            name TEXT,
+            symbol TEXT,
+            seq INTEGER,
+            quantity INTEGER,
+            price REAL,
+            opened_at TEXT,
+            PRIMARY KEY (name, symbol, seq)
+        ) WITHOUT ROWID
+    ''')
+    # Realized profit or loss per symbol, kept after a position is closed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS position_pnl (
+            name TEXT,
+            symbol TEXT,
+            realized_pnl REAL,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            symbol TEXT,
+            quantity INTEGER,
+            price REAL,
+            timestamp TEXT,
+            rationale TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_name ON transactions (name, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            datetime TEXT,
+            value REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_portfolio_values_name ON portfolio_values (name, id)')
+    # Older portfolio values, one row per account and hour or day: the last value in the bucket
+    # and when it was recorded, with the bucket's low, high and number of values rolled into it
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_value_rollups (
+            name TEXT,
+            resolution TEXT,
+            bucket TEXT,
+            datetime TEXT,
+            value REAL,
+            low REAL,
+            high REAL,
+            count INTEGER,
+            PRIMARY KEY (name, resolution, bucket)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -20,82 +282,601 @@ with sqlite3.connect(DB) as conn:
             message TEXT
         )
     ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
-
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
-        conn.commit()
-
-def read_account(name):
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_name_id ON logs (name, id)')
+    # Legacy whole-market JSON blobs; kept only so that old rows can be migrated on startup
+    conn.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS prices (
+            date TEXT,
+            symbol TEXT,
+            close REAL,
+            PRIMARY KEY (date, symbol)
+        ) WITHOUT ROWID
+    ''')
+    # The simulated time during a replay; empty in a live database, which runs on the wall clock
+    conn.execute('CREATE TABLE IF NOT EXISTS clock (id INTEGER PRIMARY KEY CHECK (id = 0), now TEXT)')
+    # Resting limit and stop orders; status is open, filled, cancelled or rejected
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            symbol TEXT,
+            side TEXT,
+            kind TEXT,
+            quantity INTEGER,
+            price REAL,
+            rationale TEXT,
+            status TEXT,
+            created TEXT,
+            updated TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_name ON orders (name, id)')
+    # Every account mutation, in order; the tables above are the current-state projection of it
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS account_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            datetime TEXT,
+            type TEXT,
+            payload TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_account_events_name ON account_events (name, id)')
+    # An account's balance, strategy and holdings as of an event, so replays start close by
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS account_snapshots (
+            name TEXT,
+            event_id INTEGER,
+            datetime TEXT,
+            state TEXT,
+            PRIMARY KEY (name, event_id)
+        ) WITHOUT ROWID
+    ''')
+    _migrate_account_blobs(conn)
+    _migrate_market_blobs(conn)
+    _snapshot_accounts_without_events(conn)
+
+def read_account(name: str) -> dict | None:
+    """
+    Read the small part of an account that every call needs: balance, strategy, holdings and
+    the running trade aggregates. Transactions and portfolio values are read separately, only
+    when they are asked for. net_invested is None if the aggregates need rebuilding.
+    """
+    conn = get_connection()
+    row = conn.execute(
+        'SELECT balance, strategy, net_invested, realized_pnl, lot_policy FROM account_state WHERE name = ?',
+        (name.lower(),),
+    ).fetchone()
+    if not row:
+        return None
+    holdings = conn.execute(
+        'SELECT symbol, quantity, cost_basis FROM holdings WHERE name = ?', (name.lower(),)
+    ).fetchall()
+    return {
+        "name": name.lower(),
+        "balance": row[0],
+        "strategy": row[1],
+        "holdings": {symbol: quantity for symbol, quantity, _ in holdings},
+        "net_invested": row[2],
+        "realized_pnl": row[3],
+        "cost_basis": {symbol: cost_basis or 0.0 for symbol, _, cost_basis in holdings},
+        "lot_policy": row[4],
+    }
+
+def write_account(name: str, balance: float, strategy: str, lot_policy: str | None = None) -> None:
+    """Create or update an account; the lot policy is only recorded when the account is created."""
+    with transaction() as conn:
+        conn.execute(UPSERT_ACCOUNT, (name.lower(), balance, strategy, lot_policy))
+
+def reset_account(name: str, balance: float, strategy: str, lot_policy: str) -> None:
+    """Clear an account's holdings and history, and start it again with the given balance."""
+    with transaction() as conn:
+        for table in (
+            "holdings", "transactions", "portfolio_values", "portfolio_value_rollups", "lots", "position_pnl",
+            "orders",
+        ):
+            conn.execute(f'DELETE FROM {table} WHERE name = ?', (name.lower(),))
+        conn.execute(UPSERT_ACCOUNT, (name.lower(), balance, strategy, lot_policy))
+        conn.execute(
+            'UPDATE account_state SET net_invested = 0, realized_pnl = 0, lot_policy = ? WHERE name = ?',
+            (lot_policy, name.lower()),
+        )
+
+def write_trade(
+    name: str,
+    balance: float,
+    trade: dict,
+    position: dict,
+    net_invested: float,
+    realized_pnl: float,
+) -> None:
+    """
+    Record a trade atomically: append the transaction, then update the position, its lots,
+    the balance and the account's trade aggregates.
+
+    Args:
+        name (str): The account name
+        balance (float): The cash balance after the trade
+        trade (dict): The transaction, as dumped from the Transaction model
+        position (dict): The traded symbol after the trade: symbol, quantity, cost_basis and
+            realized_pnl, plus lots, the (seq, quantity, price, opened_at) of each lot the
+            trade opened or changed, and closed_lots, the seqs of the lots it closed
+        net_invested (float): The account's net amount invested after the trade
+        realized_pnl (float): The account's realized profit or loss after the trade
+    """
+    name, symbol = name.lower(), position["symbol"]
+    with transaction() as conn:
+        conn.execute(
+            INSERT_TRANSACTION,
+            (name, trade["symbol"], trade["quantity"], trade["price"], trade["timestamp"], trade["rationale"]),
+        )
+        if position["quantity"]:
+            conn.execute(
+                'INSERT OR REPLACE INTO holdings (name, symbol, quantity, cost_basis) VALUES (?, ?, ?, ?)',
+                (name, symbol, position["quantity"], position["cost_basis"]),
+            )
+        else:
+            conn.execute('DELETE FROM holdings WHERE name = ? AND symbol = ?', (name, symbol))
+        conn.executemany(INSERT_LOT, [(name, symbol, *lot) for lot in position["lots"]])
+        conn.executemany(
+            'DELETE FROM lots WHERE name = ? AND symbol = ? AND seq = ?',
+            [(name, symbol, seq) for seq in position["closed_lots"]],
+        )
+        conn.execute(INSERT_POSITION_PNL, (name, symbol, position["realized_pnl"]))
+        conn.execute(
+            'UPDATE account_state SET balance = ?, net_invested = ?, realized_pnl = ? WHERE name = ?',
+            (balance, net_invested, realized_pnl, name),
+        )
+
+def write_aggregates(
+    name: str,
+    net_invested: float,
+    realized_pnl: float,
+    positions: list[dict],
+    lot_policy: str,
+) -> None:
+    """
+    Replace an account's trade aggregates and lots, after they have been rebuilt from the ledger.
+    Each position is a dict like write_trade's, with lots holding every open lot.
+    """
+    name = name.lower()
+    with transaction() as conn:
+        conn.execute(
+            'UPDATE account_state SET net_invested = ?, realized_pnl = ?, lot_policy = ? WHERE name = ?',
+            (net_invested, realized_pnl, lot_policy, name),
+        )
+        conn.execute('UPDATE holdings SET cost_basis = 0 WHERE name = ?', (name,))
+        conn.executemany(
+            'UPDATE holdings SET cost_basis = ? WHERE name = ? AND symbol = ?',
+            [(position["cost_basis"], name, position["symbol"]) for position in positions],
+        )
+        conn.execute('DELETE FROM lots WHERE name = ?', (name,))
+        conn.executemany(
+            INSERT_LOT,
+            [(name, position["symbol"], *lot) for position in positions for lot in position["lots"]],
+        )
+        conn.execute('DELETE FROM position_pnl WHERE name = ?', (name,))
+        conn.executemany(
+            INSERT_POSITION_PNL,
+            [(name, position["symbol"], position["realized_pnl"]) for position in positions],
+        )
+
+def read_lots(name: str, symbol: str) -> tuple[list[tuple], float]:
+    """
+    Read the open lots of one symbol, oldest first, as (seq, quantity, price, opened_at),
+    along with the symbol's realized profit or loss.
+    """
+    conn = get_connection()
+    lots = conn.execute(
+        'SELECT seq, quantity, price, opened_at FROM lots WHERE name = ? AND symbol = ? ORDER BY seq',
+        (name.lower(), symbol),
+    ).fetchall()
+    row = conn.execute(
+        'SELECT realized_pnl FROM position_pnl WHERE name = ? AND symbol = ?', (name.lower(), symbol)
+    ).fetchone()
+    return lots, row[0] if row else 0.0
+
+def read_positions(name: str) -> dict[str, dict]:
+    """Summarize every symbol the account has traded: realized P&L, open lot count and oldest open lot"""
+    conn = get_connection()
+    positions = {
+        symbol: {"realized_pnl": realized_pnl, "open_lots": 0, "oldest_lot": None}
+        for symbol, realized_pnl in conn.execute(
+            'SELECT symbol, realized_pnl FROM position_pnl WHERE name = ?', (name.lower(),)
+        )
+    }
+    for symbol, count, oldest in conn.execute(
+        'SELECT symbol, COUNT(*), MIN(opened_at) FROM lots WHERE name = ? GROUP BY symbol', (name.lower(),)
+    ):
+        position = positions.setdefault(symbol, {"realized_pnl": 0.0})
+        position.update(open_lots=count, oldest_lot=oldest)
+    return positions
+
+def read_held_symbols() -> list[str]:
+    """Every symbol held by any account"""
+    rows = get_connection().execute('SELECT DISTINCT symbol FROM holdings').fetchall()
+    return [row[0] for row in rows]
+
+def read_transactions(name: str) -> list[tuple]:
+    """An account's transactions, oldest first, as (symbol, quantity, price, timestamp, rationale)"""
+    return get_connection().execute('''
+        SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+        WHERE name = ?
+        ORDER BY id
+    ''', (name.lower(),)).fetchall()
+
+def read_recent_transactions(name: str, limit: int) -> tuple[int, list[tuple]]:
+    """
+    How many transactions an account has, and its latest few, oldest first, as
+    (symbol, quantity, price, timestamp, rationale); both come from the (name, id) index
+    """
+    conn = get_connection()
+    count = conn.execute('SELECT COUNT(*) FROM transactions WHERE name = ?', (name.lower(),)).fetchone()[0]
+    rows = conn.execute('''
+        SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+        WHERE name = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), limit)).fetchall()
+    return count, rows[::-1]
+
+def write_portfolio_value(name: str, when: str, value: float) -> bool:
+    """Record a portfolio value, unless it repeats the last one recorded; returns whether it was recorded"""
+    with transaction() as conn:
+        last = conn.execute(
+            'SELECT value FROM portfolio_values WHERE name = ? ORDER BY id DESC LIMIT 1', (name.lower(),)
+        ).fetchone()
+        if last is not None and last[0] == value:
+            return False
+        conn.execute(INSERT_PORTFOLIO_VALUE, (name.lower(), when, value))
+        return True
+
+ROLLUP_PORTFOLIO_VALUES = '''
+    INSERT INTO portfolio_value_rollups (name, resolution, bucket, datetime, value, low, high, count)
+    SELECT name, ?, bucket, datetime, value, low, high, count FROM (
+        SELECT name, substr(datetime, 1, ?) AS bucket, datetime, value,
+            MIN({low}) OVER bucket AS low, MAX({high}) OVER bucket AS high, SUM({count}) OVER bucket AS count,
+            ROW_NUMBER() OVER (PARTITION BY substr(datetime, 1, ?) ORDER BY datetime DESC) AS recency
+        FROM {source}
+        WHERE name = ? AND datetime < ?{filter}
+        WINDOW bucket AS (PARTITION BY substr(datetime, 1, ?))
+    )
+    WHERE recency = 1
+    ON CONFLICT (name, resolution, bucket) DO UPDATE SET
+        datetime = MAX(datetime, excluded.datetime),
+        value = CASE WHEN excluded.datetime >= datetime THEN excluded.value ELSE value END,
+        low = MIN(low, excluded.low),
+        high = MAX(high, excluded.high),
+        count = count + excluded.count
+'''
+ROLLUP_TO_HOURS = ROLLUP_PORTFOLIO_VALUES.format(
+    low="value", high="value", count="1", source="portfolio_values", filter=""
+)
+ROLLUP_TO_DAYS = ROLLUP_PORTFOLIO_VALUES.format(
+    low="low", high="high", count="count", source="portfolio_value_rollups", filter=" AND resolution = 'hour'"
+)
+
+def compact_portfolio_values(name: str, now: str) -> int:
+    """
+    Roll full-resolution values older than PORTFOLIO_VALUE_FULL_HOURS into hourly points, and
+    hourly points older than PORTFOLIO_VALUE_HOURLY_DAYS into daily ones. Cheap when there is
+    nothing to do, so it can run on every report.
+
+    Returns:
+        int: The number of full-resolution values rolled up
+    """
+    name = name.lower()
+    latest = datetime.strptime(now, "%Y-%m-%d %H:%M:%S")
+    # Cut on bucket boundaries, so that a bucket is rolled up in one go
+    hours_cutoff = (latest - timedelta(hours=PORTFOLIO_VALUE_FULL_HOURS)).strftime("%Y-%m-%d %H")
+    days_cutoff = (latest - timedelta(days=PORTFOLIO_VALUE_HOURLY_DAYS)).strftime("%Y-%m-%d")
+    conn = get_connection()
+    oldest = conn.execute(
+        'SELECT datetime FROM portfolio_values WHERE name = ? ORDER BY id LIMIT 1', (name,)
+    ).fetchone()
+    if oldest is None or oldest[0] >= hours_cutoff:
+        return 0
+    with transaction() as conn:
+        conn.execute(ROLLUP_TO_HOURS, ("hour", 13, 13, name, hours_cutoff, 13))
+        rolled = conn.execute(
+            'DELETE FROM portfolio_values WHERE name = ? AND datetime < ?', (name, hours_cutoff)
+        ).rowcount
+        conn.execute(ROLLUP_TO_DAYS, ("day", 10, 10, name, days_cutoff, 10))
+        conn.execute(
+            "DELETE FROM portfolio_value_rollups WHERE name = ? AND resolution = 'hour' AND datetime < ?",
+            (name, days_cutoff),
+        )
+    return rolled
+
+def read_portfolio_values(name: str) -> list[tuple[str, float]]:
+    """An account's portfolio values, oldest first: daily, then hourly, then at full resolution"""
+    return get_connection().execute('''
+        SELECT datetime, value FROM (
+            SELECT datetime, value, CASE resolution WHEN 'day' THEN 0 ELSE 1 END AS tier
+            FROM portfolio_value_rollups WHERE name = ?
+            UNION ALL
+            SELECT datetime, value, 2 FROM portfolio_values WHERE name = ?
+        )
+        ORDER BY datetime, tier
+    ''', (name.lower(), name.lower())).fetchall()
+
+def read_all_portfolio_values() -> list[tuple[str, str, float]]:
+    """Every account's portfolio values from every tier, as (name, datetime, value), in order within each account"""
+    return get_connection().execute('''
+        SELECT name, datetime, value FROM (
+            SELECT name, datetime, value, CASE resolution WHEN 'day' THEN 0 ELSE 1 END AS tier
+            FROM portfolio_value_rollups
+            UNION ALL
+            SELECT name, datetime, value, 2 FROM portfolio_values
+        )
+        ORDER BY name, datetime, tier
+    ''').fetchall()
+
+def latest_portfolio_value_id() -> int:
+    """Changes whenever a portfolio value is recorded, so it can key caches of derived data"""
+    return get_connection().execute('SELECT COALESCE(MAX(id), 0) FROM portfolio_values').fetchone()[0]
+
+def read_balances() -> dict[str, float]:
+    return dict(get_connection().execute('SELECT name, balance FROM account_state').fetchall())
+
 def write_log(name: str, type: str, message: str):
     """
-    Write a log entry to the logs table.
-    
+    Write a log entry to the logs table, as part of the current transaction if one is open.
+
     Args:
         name (str): The name associated with the log
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with transaction() as conn:
+        conn.execute('''
             INSERT INTO logs (name, datetime, type, message)
             VALUES (?, datetime('now'), ?, ?)
         ''', (name.lower(), type, message))
-        conn.commit()
+
+def write_logs(entries: list[tuple[str, str, str, str]]) -> None:
+    """
+    Write a batch of log entries to the logs table in a single transaction.
+
+    Args:
+        entries (list): Tuples of (name, datetime, type, message), with datetime in UTC
+    """
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO logs (name, datetime, type, message)
+            VALUES (?, ?, ?, ?)
+        ''', [(name.lower(), when, type, message) for name, when, type, message in entries])
 
 def read_log(name: str, last_n=10):
     """
     Read the most recent log entries for a given name.
-    
+
     Args:
         name (str): The name to retrieve logs for
         last_n (int): Number of most recent entries to retrieve
-        
+
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
-        
-        return reversed(cursor.fetchall())
+    cursor = get_connection().execute('''
+        SELECT datetime, type, message FROM logs
+        WHERE name = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n))
+    return reversed(cursor.fetchall())
+
+def read_log_since(name: str, after_id: int = 0, last_n: int = 10):
+    """
+    Read log entries for a given name that were written after a known entry.
+
+    Args:
+        name (str): The name to retrieve logs for
+        after_id (int): The id of the last entry already seen; 0 to start from the beginning
+        last_n (int): The maximum number of entries to return; the most recent are kept
+
+    Returns:
+        list: A list of tuples containing (id, datetime, type, message), oldest first
+    """
+    cursor = get_connection().execute('''
+        SELECT id, datetime, type, message FROM logs
+        WHERE name = ? AND id > ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), after_id, last_n))
+    return list(reversed(cursor.fetchall()))
+
+def first_log_id_since(when: str) -> int | None:
+    """Return the id of the oldest log entry written at or after the given UTC datetime"""
+    row = get_connection().execute(
+        'SELECT id FROM logs WHERE datetime >= ? ORDER BY id LIMIT 1', (when,)
+    ).fetchone()
+    return row[0] if row else None
+
+def nth_newest_log_id(n: int) -> int | None:
+    """Return the id of the n-th most recent log entry across all names, counting from 1"""
+    row = get_connection().execute(
+        'SELECT id FROM logs ORDER BY id DESC LIMIT 1 OFFSET ?', (n - 1,)
+    ).fetchone()
+    return row[0] if row else None
+
+def read_logs_through(last_id: int, limit: int) -> list[tuple]:
+    """Return up to limit of the oldest log entries with id <= last_id, as (id, name, datetime, type, message)"""
+    return get_connection().execute('''
+        SELECT id, name, datetime, type, message FROM logs
+        WHERE id <= ?
+        ORDER BY id
+        LIMIT ?
+    ''', (last_id, limit)).fetchall()
+
+def delete_logs_through(last_id: int) -> int:
+    with transaction() as conn:
+        return conn.execute('DELETE FROM logs WHERE id <= ?', (last_id,)).rowcount
 
 def write_market(date: str, data: dict) -> None:
-    data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO market (date, data)
-            VALUES (?, ?)
-            ON CONFLICT(date) DO UPDATE SET data=excluded.data
-        ''', (date, data_json))
-        conn.commit()
+    """Store the closing price of every symbol for a date, one row per symbol"""
+    with transaction() as conn:
+        conn.executemany(INSERT_PRICE, [(date, symbol, close) for symbol, close in data.items()])
 
 def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    rows = get_connection().execute('SELECT symbol, close FROM prices WHERE date = ?', (date,)).fetchall()
+    return dict(rows) if rows else None
+
+def has_market(date: str) -> bool:
+    return get_connection().execute('SELECT 1 FROM prices WHERE date = ? LIMIT 1', (date,)).fetchone() is not None
+
+def read_market_prices(date: str, symbols: list[str]) -> dict[str, float]:
+    """Look up several symbols' closing prices for a date in one query"""
+    placeholders = ", ".join("?" * len(symbols))
+    rows = get_connection().execute(
+        f'SELECT symbol, close FROM prices WHERE date = ? AND symbol IN ({placeholders})', (date, *symbols)
+    ).fetchall()
+    return dict(rows)
+
+def read_market_price(date: str, symbol: str) -> float | None:
+    """Look up a single symbol's closing price for a date, without reading the rest of the market"""
+    row = get_connection().execute(
+        'SELECT close FROM prices WHERE date = ? AND symbol = ?', (date, symbol)
+    ).fetchone()
+    return row[0] if row else None
+
+def read_symbol_closes(symbol: str, dates: list[str]) -> dict[str, float]:
+    """Look up one symbol's closing price on each of several dates, by primary key"""
+    placeholders = ", ".join("?" * len(dates))
+    rows = get_connection().execute(
+        f'SELECT date, close FROM prices WHERE symbol = ? AND date IN ({placeholders})', (symbol, *dates)
+    ).fetchall()
+    return dict(rows)
+
+def copy_market_history(source_db: str, start: str, end: str) -> list[str]:
+    """
+    Copy stored prices for dates from start to end inclusive out of another database. It is
+    only read, so it may not have been migrated yet and still hold legacy market blobs.
+
+    Returns:
+        list: The dates copied, in order
+    """
+    conn = get_connection()
+    conn.execute('ATTACH DATABASE ? AS source', (source_db,))
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM source.sqlite_master WHERE type = 'table'")}
+        with transaction():
+            if "prices" in tables:
+                conn.execute('''
+                    INSERT OR REPLACE INTO prices (date, symbol, close)
+                    SELECT date, symbol, close FROM source.prices
+                    WHERE date BETWEEN ? AND ?
+                ''', (start, end))
+            if "market" in tables:
+                blobs = conn.execute(
+                    'SELECT date, data FROM source.market WHERE date BETWEEN ? AND ?', (start, end)
+                ).fetchall()
+                for date, blob in blobs:
+                    conn.executemany(INSERT_PRICE, [(date, symbol, close) for symbol, close in json.loads(blob).items()])
+    finally:
+        conn.execute('DETACH DATABASE source')
+    rows = conn.execute(
+        'SELECT DISTINCT date FROM prices WHERE date BETWEEN ? AND ? ORDER BY date', (start, end)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def read_clock() -> str | None:
+    row = get_connection().execute('SELECT now FROM clock WHERE id = 0').fetchone()
+    return row[0] if row else None
+
+def write_clock(now: str | None) -> None:
+    with transaction() as conn:
+        if now is None:
+            conn.execute('DELETE FROM clock')
+        else:
+            conn.execute('INSERT OR REPLACE INTO clock (id, now) VALUES (0, ?)', (now,))
+
+def append_event(name: str, when: str, type: str, payload: dict) -> int:
+    """Append an account mutation to the event ledger and return its id"""
+    with transaction() as conn:
+        cursor = conn.execute(
+            'INSERT INTO account_events (name, datetime, type, payload) VALUES (?, ?, ?, ?)',
+            (name.lower(), when, type, json.dumps(payload)),
+        )
+        return cursor.lastrowid
+
+def events_since_snapshot(name: str) -> int:
+    """The number of the account's events after its latest snapshot"""
+    return get_connection().execute('''
+        SELECT COUNT(*) FROM account_events
+        WHERE name = ? AND id > (SELECT COALESCE(MAX(event_id), 0) FROM account_snapshots WHERE name = ?)
+    ''', (name.lower(), name.lower())).fetchone()[0]
+
+def write_snapshot(name: str, event_id: int, when: str, state: dict) -> None:
+    with transaction() as conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO account_snapshots (name, event_id, datetime, state) VALUES (?, ?, ?, ?)',
+            (name.lower(), event_id, when, json.dumps(state)),
+        )
+
+def read_snapshot(name: str, until: str) -> tuple[int, dict] | None:
+    """The account's latest snapshot taken at or before the given time, as (event_id, state)"""
+    row = get_connection().execute('''
+        SELECT event_id, state FROM account_snapshots
+        WHERE name = ? AND datetime <= ?
+        ORDER BY event_id DESC LIMIT 1
+    ''', (name.lower(), until)).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+def read_events(name: str, after_id: int = 0, until: str | None = None) -> list[tuple[int, str, str, dict]]:
+    """The account's events after the given id and at or before the given time, as (id, datetime, type, payload)"""
+    rows = get_connection().execute('''
+        SELECT id, datetime, type, payload FROM account_events
+        WHERE name = ? AND id > ? AND (? IS NULL OR datetime <= ?)
+        ORDER BY id
+    ''', (name.lower(), after_id, until, until)).fetchall()
+    return [(event_id, when, type, json.loads(payload)) for event_id, when, type, payload in rows]
+
+ORDER_COLUMNS = 'id, name, symbol, side, kind, quantity, price, rationale, status, created, updated'
+
+def write_order(
+    name: str, symbol: str, side: str, kind: str, quantity: int, price: float, rationale: str, when: str
+) -> int:
+    """Place a resting order and return its id"""
+    with transaction() as conn:
+        cursor = conn.execute('''
+            INSERT INTO orders (name, symbol, side, kind, quantity, price, rationale, status, created, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'open', ?, ?)
+        ''', (name.lower(), symbol, side, kind, quantity, price, rationale, when, when))
+        return cursor.lastrowid
+
+def read_open_orders(after_id: int = 0) -> list[dict]:
+    """Every open order placed after the given id, oldest first"""
+    cursor = get_connection().execute(
+        f"SELECT {ORDER_COLUMNS} FROM orders WHERE status = 'open' AND id > ? ORDER BY id", (after_id,)
+    )
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def read_orders(name: str, status: str | None = None, last_n: int = 50) -> list[dict]:
+    """An account's most recent orders, newest first, optionally only those with the given status"""
+    cursor = get_connection().execute(
+        f"SELECT {ORDER_COLUMNS} FROM orders WHERE name = ? AND (? IS NULL OR status = ?) ORDER BY id DESC LIMIT ?",
+        (name.lower(), status, status, last_n),
+    )
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def read_order(order_id: int) -> dict | None:
+    cursor = get_connection().execute(f"SELECT {ORDER_COLUMNS} FROM orders WHERE id = ?", (order_id,))
+    row = cursor.fetchone()
+    return dict(zip([column[0] for column in cursor.description], row)) if row else None
+
+def close_order(order_id: int, status: str, when: str, name: str | None = None) -> bool:
+    """
+    Move an open order to filled, cancelled or rejected. Returns False if it was no longer open,
+    so that of all the processes racing to fill or cancel an order, exactly one succeeds.
+    """
+    with transaction() as conn:
+        cursor = conn.execute(
+            "UPDATE orders SET status = ?, updated = ? WHERE id = ? AND status = 'open' AND (? IS NULL OR name = ?)",
+            (status, when, order_id, name and name.lower(), name and name.lower()),
+        )
+        return cursor.rowcount == 1
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+from database import (
+    get_connection,
+    first_log_id_since,
+    nth_newest_log_id,
+    read_logs_through,
+    delete_logs_through,
+)
+
+load_dotenv(override=True)
+
+# Log entries older than this many days are moved out of the database into the archive
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "14"))
+# Whatever their age, only this many of the most recent entries are kept in the database
+LOG_RETENTION_MAX_ROWS = int(os.getenv("LOG_RETENTION_MAX_ROWS", "200000"))
+LOG_ARCHIVE_DIR = Path(os.getenv("LOG_ARCHIVE_DIR", "log_archive"))
+
+ARCHIVE_CHUNK_ROWS = 5000
+VACUUM_PAGES = 2000
+
+
+def partition_path(date: str, archive_dir: Path = LOG_ARCHIVE_DIR) -> Path:
+    return archive_dir / f"logs-{date}.jsonl.gz"
+
+
+def archive_boundary(retention_days: float, max_rows: int) -> int | None:
+    """
+    Return the highest log id that falls outside the retention policy, or None if none does.
+    Ids increase with time, so everything up to and including this id is archived.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    first_kept = first_log_id_since(cutoff.strftime("%Y-%m-%d %H:%M:%S"))
+    by_age = nth_newest_log_id(1) if first_kept is None else first_kept - 1
+    by_count = nth_newest_log_id(max_rows + 1) if max_rows > 0 else None
+    candidates = [boundary for boundary in (by_age, by_count) if boundary]
+    return max(candidates) if candidates else None
+
+
+def write_partitions(rows: list[tuple], archive_dir: Path) -> None:
+    """Append rows to the gzip JSONL file for each row's date; appending adds a new gzip member"""
+    by_date = {}
+    for log_id, name, when, type, message in rows:
+        entry = {"id": log_id, "name": name, "datetime": when, "type": type, "message": message}
+        by_date.setdefault(when[:10], []).append(json.dumps(entry))
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    for date, lines in by_date.items():
+        with open(partition_path(date, archive_dir), "ab") as f:
+            f.write(gzip.compress(("\n".join(lines) + "\n").encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def archive_logs(
+    retention_days: float = LOG_RETENTION_DAYS,
+    max_rows: int = LOG_RETENTION_MAX_ROWS,
+    archive_dir: Path = LOG_ARCHIVE_DIR,
+) -> int:
+    """
+    Move log entries outside the retention policy into date-partitioned archive files.
+
+    Each chunk is written and synced to its archive file before it is deleted from SQLite,
+    so a crash can at worst leave an entry in both places; read_archived_logs skips duplicates.
+
+    Returns:
+        int: The number of entries archived
+    """
+    boundary = archive_boundary(retention_days, max_rows)
+    archived = 0
+    while boundary:
+        rows = read_logs_through(boundary, ARCHIVE_CHUNK_ROWS)
+        if not rows:
+            break
+        write_partitions(rows, Path(archive_dir))
+        archived += delete_logs_through(rows[-1][0])
+    return archived
+
+
+def compact(pages: int = VACUUM_PAGES) -> None:
+    """
+    Return free pages to the filesystem and truncate the WAL.
+    A database created before incremental auto-vacuum was enabled gets a one-off full VACUUM.
+    """
+    conn = get_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    else:
+        conn.execute(f"PRAGMA incremental_vacuum({pages})")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def run_retention() -> int:
+    """Archive old log entries and compact the database; returns the number archived"""
+    archived = archive_logs()
+    if archived:
+        compact()
+    return archived
+
+
+def read_archived_logs(
+    name: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    archive_dir: Path = LOG_ARCHIVE_DIR,
+):
+    """
+    Read archived log entries, oldest first, opening only the partitions in the date range.
+
+    Args:
+        name (str): Only return entries for this name, if given
+        start (str): The first date to read, as YYYY-MM-DD, if given
+        end (str): The last date to read, as YYYY-MM-DD, if given
+
+    Yields:
+        tuple: (id, datetime, type, message), the same shape as read_log_since
+    """
+    seen = set()
+    for path in sorted(Path(archive_dir).glob("logs-*.jsonl.gz")):
+        date = path.name[len("logs-") : -len(".jsonl.gz")]
+        if (start and date < start) or (end and date > end):
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["id"] in seen or (name and entry["name"] != name.lower()):
+                    continue
+                seen.add(entry["id"])
+                yield entry["id"], entry["datetime"], entry["type"], entry["message"]
+
+
+if __name__ == "__main__":
+    print(f"Archived {run_retention()} log entries to {LOG_ARCHIVE_DIR}")
@@ -0,0 +1,128 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from database import write_logs
+
+load_dotenv(override=True)
+
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "0.25"))
+
+
+class LogWriter:
+    """
+    A background sink for the logs table.
+
+    write() only puts the entry on a bounded queue, so callers on the asyncio event loop never
+    wait on the database. A daemon thread drains the queue and inserts entries in batches,
+    committing once per batch: whenever batch_size entries are waiting, or flush_interval
+    seconds after the first entry of a batch arrived, whichever comes first.
+    If the queue is full the entry is dropped and counted, rather than stalling the caller.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.last_batch_seconds = 0.0
+
+    def _ensure_started(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def write(self, name: str, type: str, message: str) -> None:
+        if self._stopped:
+            return
+        self._ensure_started()
+        when = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            self._queue.put_nowait((name, when, type, message))
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued before this call is written; False on timeout"""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            # The queue may be full while the writer thread waits on a database lock
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(deadline - time.monotonic(), 0))
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self.flush(timeout)
+        self._stopped = True
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "last_batch_seconds": self.last_batch_seconds,
+        }
+
+    def _run(self) -> None:
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_batch(self, batch: list) -> None:
+        start = time.perf_counter()
+        try:
+            write_logs(batch)
+        except Exception as e:
+            print(f"Failed to write {len(batch)} log entries: {e}")
+            self.dropped += len(batch)
+            return
+        self.last_batch_seconds = time.perf_counter() - start
+        self.written += len(batch)
+        self.batches += 1
@@ -0,0 +1,88 @@
+import os
+from collections import deque
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+LOT_POLICIES = ("fifo", "lifo", "average")
+
+# Which open lots a sale closes: the oldest first, the newest first, or one lot at average cost
+TAX_LOT_POLICY = os.getenv("TAX_LOT_POLICY", "fifo").strip().lower()
+if TAX_LOT_POLICY not in LOT_POLICIES:
+    raise ValueError(f"TAX_LOT_POLICY must be one of {', '.join(LOT_POLICIES)}, not {TAX_LOT_POLICY!r}")
+
+
+class Lot:
+    """Shares of one symbol bought together, identified within the symbol by seq"""
+
+    __slots__ = ("seq", "quantity", "price", "opened_at")
+
+    def __init__(self, seq: int, quantity: int, price: float, opened_at: str):
+        self.seq = seq
+        self.quantity = quantity
+        self.price = price
+        self.opened_at = opened_at
+
+    def row(self) -> tuple[int, int, float, str]:
+        return self.seq, self.quantity, self.price, self.opened_at
+
+
+class LotBook:
+    """
+    The open lots of one symbol in one account, oldest on the left of a deque.
+
+    Buying appends a lot (or, at average cost, merges into the single lot), and selling
+    consumes lots from whichever end the policy says, so each trade costs O(lots it touches)
+    however long the history. The quantity, cost basis and realized profit or loss are kept
+    as running totals.
+    """
+
+    def __init__(self, policy: str = TAX_LOT_POLICY, lots=(), realized_pnl: float = 0.0):
+        self.policy = policy
+        self.lots: deque[Lot] = deque(lots)
+        self.quantity = sum(lot.quantity for lot in self.lots)
+        self.cost_basis = sum(lot.quantity * lot.price for lot in self.lots)
+        self.realized_pnl = realized_pnl
+        self.next_seq = max((lot.seq for lot in self.lots), default=-1) + 1
+
+    def buy(self, quantity: int, price: float, when: str) -> list[Lot]:
+        """Add shares; returns the lots opened or changed"""
+        self.quantity += quantity
+        self.cost_basis += quantity * price
+        if self.policy == "average" and self.lots:
+            lot = self.lots[0]
+            lot.quantity = self.quantity
+            lot.price = self.cost_basis / self.quantity
+        else:
+            lot = Lot(self.next_seq, quantity, price, when)
+            self.next_seq += 1
+            self.lots.append(lot)
+        return [lot]
+
+    def sell(self, quantity: int, price: float) -> tuple[float, list[Lot], list[int]]:
+        """
+        Remove shares from the lots the policy picks.
+
+        Returns:
+            tuple: The realized profit or loss, the lots partly sold, and the seqs of the lots closed
+        """
+        realized, changed, closed = 0.0, [], []
+        remaining = quantity
+        while remaining and self.lots:
+            lot = self.lots[-1] if self.policy == "lifo" else self.lots[0]
+            sold = min(remaining, lot.quantity)
+            realized += (price - lot.price) * sold
+            self.cost_basis -= lot.price * sold
+            lot.quantity -= sold
+            remaining -= sold
+            if lot.quantity:
+                changed = [lot]
+            elif self.policy == "lifo":
+                closed.append(self.lots.pop().seq)
+            else:
+                closed.append(self.lots.popleft().seq)
+        self.quantity -= quantity - remaining
+        if not self.lots:
+            self.cost_basis = 0.0
+        self.realized_pnl += realized
+        return realized, changed, closed
@@ -1,9 +1,14 @@
-from polygon import RESTClient
+from polygon_client import polygon_client
 from dotenv import load_dotenv
 import os
+import sys
 from datetime import datetime
-import random
-from database import write_market, read_market
+import time
+from database import write_market, has_market, read_market_prices
+from price_cache import open_shared_price_cache
+from simulator import simulated_prices, EXCHANGE_TZ
+import clock
+from market_calendar import market_calendar
 from functools import lru_cache
 from datetime import timezone
 
@@ -12,59 +17,225 @@ load_dotenv(override=True)
 polygon_api_key = os.getenv("POLYGON_API_KEY")
 polygon_plan = os.getenv("POLYGON_PLAN")
 
-is_paid_polygon = polygon_plan == "paid"
-is_realtime_polygon = polygon_plan == "realtime"
+# A replay (see trading_floor.py) trades against stored prices, whatever the Polygon plan
+is_replay = bool(os.getenv("REPLAY_START"))
+
+is_paid_polygon = polygon_plan == "paid" and not is_replay
+is_realtime_polygon = polygon_plan == "realtime" and not is_replay
+
+# Use the seeded market simulator instead of Polygon, for offline runs and reproducible load tests
+use_market_simulator = os.getenv("MARKET_SIMULATOR", "false").strip().lower() == "true"
+
+# How old a cached price may be before it is fetched again
+PRICE_CACHE_TTL_SECONDS = float(os.getenv("PRICE_CACHE_TTL_SECONDS", "60"))
+
+# How long other processes wait for one that has claimed symbols to fetch before fetching them
+# themselves; longer than a Polygon call with all its retries
+PRICE_FETCH_CLAIM_SECONDS = float(os.getenv("PRICE_FETCH_CLAIM_SECONDS", "60"))
+CLAIM_POLL_SECONDS = 0.02
+
+# symbol -> (price, time.time() when it was fetched)
+_price_cache: dict[str, tuple[float, float]] = {}
+
+# Prices published by whichever process on this host fetched them first; None if unsupported
+shared_prices = open_shared_price_cache()
+
+# Called with {symbol: price} whenever this process fetches or is pushed new prices
+_price_listeners = []
+
+
+def add_price_listener(listener) -> None:
+    if listener not in _price_listeners:
+        _price_listeners.append(listener)
+
+
+def notify_price_listeners(prices: dict[str, float]) -> None:
+    for listener in _price_listeners:
+        try:
+            listener(prices)
+        except Exception as e:
+            print(f"Price listener {listener} failed due to {e}", file=sys.stderr)
 
 
 def is_market_open() -> bool:
-    client = RESTClient(polygon_api_key)
-    market_status = client.get_market_status()
-    return market_status.market == "open"
+    return market_calendar.is_open()
 
 
 def get_all_share_prices_polygon_eod() -> dict[str, float]:
     """With much thanks to student Reema R. for fixing the timezone issue with this!"""
-    client = RESTClient(polygon_api_key)
+    client = polygon_client()
 
-    probe = client.get_previous_close_agg("SPY")[0]
+    probe = client.call("get_previous_close_agg", "SPY")[0]
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
 
-    results = client.get_grouped_daily_aggs(last_close, adjusted=True, include_otc=False)
+    results = client.call("get_grouped_daily_aggs", last_close, adjusted=True, include_otc=False)
     return {result.ticker: result.close for result in results}
 
 
 @lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
-    return market_data
+def load_market_for_prior_date(today) -> None:
+    if not has_market(today):
+        write_market(today, get_all_share_prices_polygon_eod())
 
 
-def get_share_price_polygon_eod(symbol) -> float:
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
     today = datetime.now().date().strftime("%Y-%m-%d")
-    market_data = get_market_for_prior_date(today)
-    return market_data.get(symbol, 0.0)
+    load_market_for_prior_date(today)
+    return read_market_prices(today, symbols)
 
 
-def get_share_price_polygon_min(symbol) -> float:
-    client = RESTClient(polygon_api_key)
-    result = client.get_snapshot_ticker("stocks", symbol)
-    return result.min.close or result.prev_day.close
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    """One snapshot request for all the symbols, rather than one per symbol"""
+    results = polygon_client().call("get_snapshot_all", "stocks", tickers=symbols)
+    return {
+        result.ticker: (result.min and result.min.close) or (result.prev_day and result.prev_day.close) or 0.0
+        for result in results
+    }
 
 
-def get_share_price_polygon(symbol) -> float:
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
     if is_paid_polygon:
-        return get_share_price_polygon_min(symbol)
+        return get_share_prices_polygon_min(symbols)
     else:
-        return get_share_price_polygon_eod(symbol)
+        return get_share_prices_polygon_eod(symbols)
 
 
-def get_share_price(symbol) -> float:
-    if polygon_api_key:
+def fetch_share_prices(symbols: list[str]) -> dict[str, float]:
+    if polygon_api_key and not use_market_simulator:
         try:
-            return get_share_price_polygon(symbol)
+            return get_share_prices_polygon(symbols)
         except Exception as e:
-            print(f"Was not able to use the polygon API due to {e}; using a random number")
-    return float(random.randint(1, 100))
+            print(f"Was not able to use the polygon API due to {e}; using simulated prices")
+    return simulated_prices(symbols)
+
+
+def _from_shared_cache(symbols: list[str], prices: dict[str, float], max_age: float) -> list[str]:
+    """Fill in prices that another process has fetched recently; return the symbols still missing"""
+    fresh = shared_prices.get_fresh(symbols, max_age)
+    for symbol, (price, fetched_at) in fresh.items():
+        prices[symbol] = price
+        _price_cache[symbol] = (price, fetched_at)
+    return [symbol for symbol in symbols if symbol not in fresh]
+
+
+def _fetch_into_caches(symbols: list[str], prices: dict[str, float]) -> None:
+    """Fetch upstream, outside any lock, then publish to this process and the host"""
+    fetched = fetch_share_prices(symbols)
+    fetched_at = time.time()
+    for symbol in symbols:
+        prices[symbol] = fetched.get(symbol, 0.0)
+        _price_cache[symbol] = (prices[symbol], fetched_at)
+    if shared_prices:
+        with shared_prices.writer():
+            for symbol in symbols:
+                shared_prices.put(symbol, prices[symbol], fetched_at)
+
+
+def _fetch_shared(symbols: list[str], prices: dict[str, float], max_age: float) -> None:
+    """
+    Fetch the symbols that no other process on the host is already fetching, and wait for
+    the rest to be published. The writer lock is held only to claim symbols, never while
+    fetching, so one slow upstream call does not hold up lookups of other symbols.
+    """
+    started = time.time()
+
+    def since_started() -> float:
+        """Anything published since this call began is fresh enough, whatever max_age is"""
+        return max(max_age, time.time() - started)
+
+    missing = symbols
+    while missing:
+        with shared_prices.writer():
+            missing = _from_shared_cache(missing, prices, since_started())
+            claimed, elsewhere = shared_prices.claim(missing, PRICE_FETCH_CLAIM_SECONDS)
+        if claimed:
+            try:
+                _fetch_into_caches(list(claimed), prices)
+            except BaseException:
+                with shared_prices.writer():
+                    shared_prices.release(claimed)
+                raise
+        missing = elsewhere
+        deadline = time.time() + PRICE_FETCH_CLAIM_SECONDS
+        while missing and time.time() < deadline:
+            time.sleep(CLAIM_POLL_SECONDS)
+            missing = _from_shared_cache(missing, prices, since_started())
+            if not any(shared_prices.is_claimed(symbol, PRICE_FETCH_CLAIM_SECONDS) for symbol in missing):
+                break
+        # Whatever is still missing was given up or abandoned, so claim it on the next pass
+
+
+def publish_prices(prices: dict[str, float], fetched_at: float | None = None) -> None:
+    """Put prices pushed by a streaming feed into this process's cache and the host's shared cache"""
+    fetched_at = fetched_at or time.time()
+    for symbol, price in prices.items():
+        _price_cache[symbol] = (price, fetched_at)
+    if shared_prices:
+        with shared_prices.writer():
+            for symbol, price in prices.items():
+                shared_prices.put(symbol, price, fetched_at)
+    notify_price_listeners(prices)
+
+
+def get_share_prices_replay(symbols: list[str]) -> dict[str, float]:
+    """
+    The prices as of the replay's simulated date: the stored end-of-day market for that date,
+    or the market simulator if none was stored. Nothing is cached, since the date keeps moving.
+    """
+    when = clock.now()
+    today = when.date().strftime("%Y-%m-%d")
+    if has_market(today):
+        stored = read_market_prices(today, symbols)
+        return {symbol: stored.get(symbol, 0.0) for symbol in symbols}
+    return simulated_prices(symbols, when.replace(tzinfo=EXCHANGE_TZ))
+
+
+def get_share_prices(symbols, max_age: float = PRICE_CACHE_TTL_SECONDS) -> dict[str, float]:
+    """
+    Return the current price of each symbol, 0.0 for symbols that are not recognized.
+
+    Prices fetched within the last max_age seconds come from this process's cache, or else from
+    the cache shared by all processes on the host. The rest are fetched together in a single
+    batch by whichever process claims them first; any other process that needs them waits
+    until they are published.
+    """
+    if clock.is_simulated():
+        return get_share_prices_replay(list(dict.fromkeys(symbols)))
+    now = time.time()
+    prices = {}
+    missing = []
+    for symbol in dict.fromkeys(symbols):
+        cached = _price_cache.get(symbol)
+        if cached and now - cached[1] < max_age:
+            prices[symbol] = cached[0]
+        else:
+            missing.append(symbol)
+    if missing and shared_prices:
+        missing = _from_shared_cache(missing, prices, max_age)
+        if missing:
+            _fetch_shared(missing, prices, max_age)
+    elif missing:
+        _fetch_into_caches(missing, prices)
+    if missing:
+        notify_price_listeners({symbol: prices[symbol] for symbol in missing})
+    return prices
+
+
+def get_cached_share_prices(symbols) -> dict[str, float]:
+    """
+    The last price this process or another on the host saw for each symbol, however old,
+    without ever fetching one; symbols with no price yet are left out. For valuing holdings
+    while the database write lock is held.
+    """
+    if clock.is_simulated():
+        return get_share_prices_replay(list(dict.fromkeys(symbols)))
+    prices = {}
+    for symbol in dict.fromkeys(symbols):
+        cached = _price_cache.get(symbol) or (shared_prices and shared_prices.get(symbol))
+        if cached and cached[0]:
+            prices[symbol] = cached[0]
+    return prices
+
+
+def get_share_price(symbol) -> float:
+    return get_share_prices([symbol])[symbol]
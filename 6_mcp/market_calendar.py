@@ -0,0 +1,104 @@
+import os
+from datetime import date, datetime, time, timedelta
+from polygon_client import polygon_client
+from dotenv import load_dotenv
+from simulator import EXCHANGE_TZ
+
+load_dotenv(override=True)
+
+polygon_api_key = os.getenv("POLYGON_API_KEY")
+
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+REFRESH_EVERY = timedelta(days=1)
+
+# NYSE full-day closures and 1pm early closes; upcoming ones are refreshed from Polygon daily
+HOLIDAYS = {
+    date(2025, 1, 1), date(2025, 1, 9), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18),
+    date(2025, 5, 26), date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27),
+    date(2025, 12, 25),
+    date(2026, 1, 1), date(2026, 1, 19), date(2026, 2, 16), date(2026, 4, 3), date(2026, 5, 25),
+    date(2026, 6, 19), date(2026, 7, 3), date(2026, 9, 7), date(2026, 11, 26), date(2026, 12, 25),
+    date(2027, 1, 1), date(2027, 1, 18), date(2027, 2, 15), date(2027, 3, 26), date(2027, 5, 31),
+    date(2027, 6, 18), date(2027, 7, 5), date(2027, 9, 6), date(2027, 11, 25), date(2027, 12, 24),
+}
+EARLY_CLOSES = {
+    date(2025, 7, 3): EARLY_CLOSE, date(2025, 11, 28): EARLY_CLOSE, date(2025, 12, 24): EARLY_CLOSE,
+    date(2026, 11, 27): EARLY_CLOSE, date(2026, 12, 24): EARLY_CLOSE,
+    date(2027, 11, 26): EARLY_CLOSE,
+}
+
+
+class MarketCalendar:
+    """
+    Works out whether the market is open locally, from regular exchange hours and a table of
+    holidays and early closes, instead of asking Polygon on every scheduler cycle.
+    The table is refreshed from Polygon's upcoming market holidays at most once a day.
+    """
+
+    def __init__(self):
+        self.holidays = set(HOLIDAYS)
+        self.early_closes = dict(EARLY_CLOSES)
+        self.refreshed_at = None
+
+    def refresh(self) -> None:
+        if not polygon_api_key:
+            return
+        now = datetime.now(EXCHANGE_TZ)
+        if self.refreshed_at and now - self.refreshed_at < REFRESH_EVERY:
+            return
+        self.refreshed_at = now
+        try:
+            holidays = polygon_client().call("get_market_holidays")
+        except Exception as e:
+            print(f"Was not able to refresh market holidays from polygon due to {e}")
+            return
+        for holiday in holidays:
+            if holiday.exchange != "NYSE" or not holiday.date:
+                continue
+            day = date.fromisoformat(holiday.date)
+            if holiday.status == "closed":
+                self.holidays.add(day)
+            elif holiday.status == "early-close" and holiday.close:
+                close = datetime.fromisoformat(holiday.close.replace("Z", "+00:00"))
+                self.early_closes[day] = close.astimezone(EXCHANGE_TZ).time()
+
+    def session(self, day: date) -> tuple[datetime, datetime] | None:
+        """The open and close of the given day's regular session, or None if there isn't one"""
+        if day.weekday() >= 5 or day in self.holidays:
+            return None
+        close = self.early_closes.get(day, REGULAR_CLOSE)
+        return (
+            datetime.combine(day, REGULAR_OPEN, EXCHANGE_TZ),
+            datetime.combine(day, close, EXCHANGE_TZ),
+        )
+
+    def _now(self, at: datetime | None) -> datetime:
+        self.refresh()
+        return (at or datetime.now(EXCHANGE_TZ)).astimezone(EXCHANGE_TZ)
+
+    def _sessions_from(self, day: date):
+        while True:
+            session = self.session(day)
+            if session:
+                yield session
+            day += timedelta(days=1)
+
+    def is_open(self, at: datetime | None = None) -> bool:
+        at = self._now(at)
+        session = self.session(at.date())
+        return session is not None and session[0] <= at < session[1]
+
+    def next_open(self, at: datetime | None = None) -> datetime:
+        """The first session open after the given time, or now"""
+        at = self._now(at)
+        return next(start for start, _ in self._sessions_from(at.date()) if start > at)
+
+    def next_close(self, at: datetime | None = None) -> datetime:
+        """The first session close after the given time, or now"""
+        at = self._now(at)
+        return next(end for _, end in self._sessions_from(at.date()) if end > at)
+
+
+market_calendar = MarketCalendar()
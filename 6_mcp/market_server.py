@@ -1,5 +1,8 @@
+import asyncio
 from mcp.server.fastmcp import FastMCP
 from market import get_share_price
+from orders import start_order_matching
+from mcp_transport import serve, MARKET_SERVER_PORT
 
 mcp = FastMCP("market_server")
 
@@ -10,7 +13,8 @@ async def lookup_share_price(symbol: str) -> float:
     Args:
         symbol: the symbol of the stock
     """
-    return get_share_price(symbol)
+    return await asyncio.to_thread(get_share_price, symbol)
 
 if __name__ == "__main__":
-    mcp.run(transport='stdio')
\ No newline at end of file
+    start_order_matching()
+    serve(mcp, MARKET_SERVER_PORT)
\ No newline at end of file
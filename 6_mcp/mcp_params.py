@@ -1,12 +1,17 @@
 import os
 from dotenv import load_dotenv
-from market import is_paid_polygon, is_realtime_polygon
+from market import is_paid_polygon, is_realtime_polygon, is_replay
+from database import DB
+from mcp_transport import ACCOUNTS_SERVER_URL, MARKET_SERVER_URL
 
 load_dotenv(override=True)
 
 brave_env = {"BRAVE_API_KEY": os.getenv("BRAVE_API_KEY")}
 polygon_api_key = os.getenv("POLYGON_API_KEY")
 
+# Our own servers must open the same database as the trading floor, which may be a replay database
+db_env = {"ACCOUNTS_DB": DB}
+
 # The MCP server for the Trader to read Market Data
 
 if is_paid_polygon or is_realtime_polygon:
@@ -15,14 +20,22 @@ if is_paid_polygon or is_realtime_polygon:
         "args": ["--from", "git+https://github.com/polygon-io/mcp_polygon@v0.1.0", "mcp_polygon"],
         "env": {"POLYGON_API_KEY": polygon_api_key},
     }
+elif MARKET_SERVER_URL:
+    market_mcp = {"url": MARKET_SERVER_URL}
+else:
+    market_mcp = {"command": "uv", "args": ["run", "market_server.py"], "env": db_env}
+
+# Traders share one accounts server when it is served over HTTP, instead of each spawning one
+if ACCOUNTS_SERVER_URL:
+    accounts_mcp = {"url": ACCOUNTS_SERVER_URL}
 else:
-    market_mcp = {"command": "uv", "args": ["run", "market_server.py"]}
+    accounts_mcp = {"command": "uv", "args": ["run", "accounts_server.py"], "env": db_env}
 
 
 # The full set of MCP servers for the trader: Accounts, Push Notification and the Market
 
 trader_mcp_server_params = [
-    {"command": "uv", "args": ["run", "accounts_server.py"]},
+    accounts_mcp,
     {"command": "uv", "args": ["run", "push_server.py"]},
     market_mcp,
 ]
@@ -31,6 +44,7 @@ trader_mcp_server_params = [
 
 
 def researcher_mcp_server_params(name: str):
+    memory = f"replay_{name}" if is_replay else name
     return [
         {"command": "uvx", "args": ["mcp-server-fetch"]},
         {
@@ -41,6 +55,6 @@ def researcher_mcp_server_params(name: str):
         {
             "command": "npx",
             "args": ["-y", "mcp-memory-libsql"],
-            "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
+            "env": {"LIBSQL_URL": f"file:./memory/{memory}.db"},
         },
     ]
@@ -0,0 +1,54 @@
+import argparse
+import os
+import uvicorn
+from dotenv import load_dotenv
+from mcp.server.fastmcp import FastMCP
+
+load_dotenv(override=True)
+
+MCP_HOST = os.getenv("MCP_HOST", "127.0.0.1")
+# Concurrent connections an HTTP server accepts before answering 503
+MCP_HTTP_CONNECTION_LIMIT = int(os.getenv("MCP_HTTP_CONNECTION_LIMIT", "64"))
+
+ACCOUNTS_SERVER_PORT = int(os.getenv("ACCOUNTS_SERVER_PORT", "8001"))
+MARKET_SERVER_PORT = int(os.getenv("MARKET_SERVER_PORT", "8002"))
+
+# Shared servers that traders connect to instead of spawning their own, such as
+# http://127.0.0.1:8001/mcp for streamable HTTP or http://127.0.0.1:8001/sse for SSE
+ACCOUNTS_SERVER_URL = os.getenv("ACCOUNTS_SERVER_URL")
+MARKET_SERVER_URL = os.getenv("MARKET_SERVER_URL")
+
+MCP_TRANSPORTS = ("stdio", "streamable-http", "sse")
+
+
+def is_sse_url(url: str) -> bool:
+    return url.rstrip("/").endswith("/sse")
+
+
+def transport_from_args() -> str:
+    """
+    How this server serves: "stdio" for one process per client, or "streamable-http" or "sse" for
+    one shared server per host, as in `uv run accounts_server.py --transport streamable-http`.
+    It is only ever given on the command line, so a server spawned over stdio always speaks stdio.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transport", choices=MCP_TRANSPORTS, default="stdio")
+    return parser.parse_args().transport
+
+
+def serve(mcp: FastMCP, port: int, transport: str | None = None) -> None:
+    """Run an MCP server over stdio, or over HTTP with a cap on concurrent connections"""
+    transport = transport or transport_from_args()
+    if transport not in MCP_TRANSPORTS:
+        raise ValueError(f"The transport must be one of {', '.join(MCP_TRANSPORTS)}, not {transport!r}")
+    if transport == "stdio":
+        mcp.run(transport="stdio")
+        return
+    app = mcp.streamable_http_app() if transport == "streamable-http" else mcp.sse_app()
+    uvicorn.run(
+        app,
+        host=MCP_HOST,
+        port=port,
+        limit_concurrency=MCP_HTTP_CONNECTION_LIMIT,
+        log_level=mcp.settings.log_level.lower(),
+    )
@@ -0,0 +1,226 @@
+import heapq
+import sys
+import threading
+from dotenv import load_dotenv
+import clock
+from accounts import Account, SPREAD
+from market import add_price_listener, get_share_prices
+from database import write_order, read_order, read_open_orders, read_orders, close_order, write_log, transaction
+
+load_dotenv(override=True)
+
+ORDER_SIDES = ("buy", "sell")
+ORDER_KINDS = ("limit", "stop")
+
+
+class RestingOrder:
+    """An open limit or stop order, as held in memory by the matching engine"""
+
+    __slots__ = ("id", "name", "symbol", "side", "kind", "quantity", "price", "rationale")
+
+    def __init__(self, id, name, symbol, side, kind, quantity, price, rationale, **_):
+        self.id = id
+        self.name = name
+        self.symbol = symbol
+        self.side = side
+        self.kind = kind
+        self.quantity = quantity
+        self.price = price
+        self.rationale = rationale
+
+    def trigger(self) -> tuple[bool, float]:
+        """
+        Whether the order fires when the market price falls to a threshold (rather than rises
+        to it), and that threshold. A limit fills once the price after the spread is no worse
+        than the limit; a stop fires once the market price crosses the stop.
+        """
+        if self.kind == "limit" and self.side == "buy":
+            return True, self.price / (1 + SPREAD)
+        if self.kind == "limit":
+            return False, self.price / (1 - SPREAD)
+        return self.side == "sell", self.price
+
+
+class SymbolBook:
+    """
+    One symbol's open orders in two heaps: a max-heap of the thresholds that fire as the price
+    falls and a min-heap of those that fire as it rises. A tick only pops the orders that fire,
+    so it costs O(log n) per fill however many orders rest.
+    """
+
+    def __init__(self):
+        self.falling: list[tuple[float, int]] = []
+        self.rising: list[tuple[float, int]] = []
+
+    def add(self, order: RestingOrder) -> None:
+        falling, threshold = order.trigger()
+        if falling:
+            heapq.heappush(self.falling, (-threshold, order.id))
+        else:
+            heapq.heappush(self.rising, (threshold, order.id))
+
+    def triggered(self, price: float) -> list[int]:
+        """Pop the ids of every order that fires at this price, oldest first within a threshold"""
+        ids = []
+        while self.falling and -self.falling[0][0] >= price:
+            ids.append(heapq.heappop(self.falling)[1])
+        while self.rising and self.rising[0][0] <= price:
+            ids.append(heapq.heappop(self.rising)[1])
+        return ids
+
+    def __len__(self) -> int:
+        return len(self.falling) + len(self.rising)
+
+
+class OrderBook:
+    """
+    The matching engine: every open order, in per-symbol books, matched as prices arrive.
+
+    Any process may run it. Prices that arrive while fetching or streaming are only queued,
+    and a matcher thread fills against them in transactions of its own, so that a fill never
+    runs inside another caller's unit of work. New orders are picked up from the database by
+    id, and each fill first claims its order with a conditional update, in the same
+    transaction as the trade, so an order is filled at most once across processes.
+    Cancelling only changes the order's status; the heap entry is dropped lazily when it
+    next fires and its claim fails.
+    """
+
+    def __init__(self):
+        self.books: dict[str, SymbolBook] = {}
+        self.orders: dict[int, RestingOrder] = {}
+        self.last_id = 0
+        self._lock = threading.RLock()
+        self._queued: dict[str, float] = {}
+        self._arrived = threading.Condition()
+        self._matcher = None
+
+    def sync(self) -> None:
+        """Load orders placed since the last sync, by this or any other process"""
+        for row in read_open_orders(self.last_id):
+            order = RestingOrder(**row)
+            self.orders[order.id] = order
+            self.books.setdefault(order.symbol, SymbolBook()).add(order)
+            self.last_id = order.id
+
+    def symbols(self) -> list[str]:
+        with self._lock:
+            self.sync()
+            return [symbol for symbol, book in self.books.items() if book]
+
+    def queue(self, prices: dict[str, float]) -> None:
+        """A price listener: hand the prices to the matcher thread, keeping the latest per symbol"""
+        with self._arrived:
+            self._queued.update(prices)
+            self._arrived.notify()
+
+    def start(self) -> None:
+        with self._arrived:
+            if self._matcher is None:
+                self._matcher = threading.Thread(target=self._match_queued, name="order-matcher", daemon=True)
+                self._matcher.start()
+
+    def _match_queued(self) -> None:
+        while True:
+            with self._arrived:
+                while not self._queued:
+                    self._arrived.wait()
+                prices, self._queued = self._queued, {}
+            # The MCP servers run this thread and speak JSON-RPC over stdout, so report on stderr
+            try:
+                for fill in self.match(prices):
+                    print(fill, file=sys.stderr)
+            except Exception as e:
+                print(f"Was not able to match orders due to {e}", file=sys.stderr)
+
+    def forget(self, order_id: int) -> None:
+        self.orders.pop(order_id, None)
+
+    def match(self, prices: dict[str, float]) -> list[str]:
+        """Fill every open order that fires at these prices; returns a description of each fill"""
+        fills = []
+        with self._lock:
+            self.sync()
+            for symbol, price in prices.items():
+                book = self.books.get(symbol)
+                if not book or not price:
+                    continue
+                fired = [self.orders.pop(order_id) for order_id in book.triggered(price) if order_id in self.orders]
+                for order in fired:
+                    try:
+                        fills.append(self._fill(order, price))
+                    except Exception as e:
+                        # Still open in the database, so rest it again and retry on a later price
+                        print(f"Was not able to fill order {order.id} due to {e}", file=sys.stderr)
+                        self.orders[order.id] = order
+                        book.add(order)
+        return [fill for fill in fills if fill]
+
+    def _fill(self, order: RestingOrder, price: float) -> str | None:
+        account = Account.get(order.name)
+        now = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        with account.unit_of_work():
+            account.reload()
+            if order.side == "buy" and price * (1 + SPREAD) * order.quantity > account.balance:
+                problem = "insufficient funds"
+            elif order.side == "sell" and account.holdings.get(order.symbol, 0) < order.quantity:
+                problem = "not enough shares held"
+            else:
+                problem = None
+            if not close_order(order.id, "rejected" if problem else "filled", now):
+                return None
+            description = f"{order.kind} order {order.id} to {order.side} {order.quantity} of {order.symbol}"
+            if problem:
+                write_log(order.name, "account", f"Rejected {description}: {problem}")
+                return None
+            apply = account.apply_buy if order.side == "buy" else account.apply_sell
+            apply(order.symbol, order.quantity, price, order.rationale)
+            write_log(order.name, "account", f"Filled {description} at {price:.2f}")
+        return f"Filled {description} at {price:.2f} for {order.name}"
+
+
+order_book = OrderBook()
+
+
+def start_order_matching() -> None:
+    """Match resting orders, on a thread of their own, against every price this process fetches or is pushed"""
+    order_book.start()
+    add_price_listener(order_book.queue)
+
+
+def match_open_orders() -> list[str]:
+    """Sweep every symbol with open orders against current prices"""
+    symbols = order_book.symbols()
+    return order_book.match(get_share_prices(symbols)) if symbols else []
+
+
+def place_order(name: str, symbol: str, side: str, kind: str, quantity: int, price: float, rationale: str) -> str:
+    """Place a resting limit or stop order, then match it at once in case it is already marketable"""
+    if side not in ORDER_SIDES:
+        raise ValueError(f"The side must be one of {', '.join(ORDER_SIDES)}")
+    if kind not in ORDER_KINDS:
+        raise ValueError(f"The kind of order must be one of {', '.join(ORDER_KINDS)}")
+    if quantity <= 0 or price <= 0:
+        raise ValueError("The quantity and price must be positive")
+    now = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction():
+        order_id = write_order(name, symbol, side, kind, quantity, price, rationale, now)
+        write_log(name, "account", f"Placed {kind} order {order_id} to {side} {quantity} of {symbol} at {price}")
+    order_book.match(get_share_prices([symbol]))
+    status = read_order(order_id)["status"]
+    return f"Placed {kind} order {order_id} to {side} {quantity} of {symbol} at {price}; it is {status}"
+
+
+def cancel_order(name: str, order_id: int) -> str:
+    now = clock.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction():
+        cancelled = close_order(order_id, "cancelled", now, name)
+        if cancelled:
+            write_log(name, "account", f"Cancelled order {order_id}")
+    if not cancelled:
+        raise ValueError(f"There is no open order {order_id} for {name}")
+    order_book.forget(order_id)
+    return f"Cancelled order {order_id}"
+
+
+def list_orders(name: str, status: str | None = "open") -> list[dict]:
+    return read_orders(name, status)
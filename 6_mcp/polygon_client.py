@@ -0,0 +1,118 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from polygon import RESTClient
+from urllib3.exceptions import HTTPError
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+polygon_api_key = os.getenv("POLYGON_API_KEY")
+
+POLYGON_MAX_CONCURRENCY = int(os.getenv("POLYGON_MAX_CONCURRENCY", "4"))
+POLYGON_RETRIES = int(os.getenv("POLYGON_RETRIES", "3"))
+POLYGON_BACKOFF_SECONDS = float(os.getenv("POLYGON_BACKOFF_SECONDS", "0.25"))
+POLYGON_TIMEOUT_SECONDS = float(os.getenv("POLYGON_TIMEOUT_SECONDS", "10"))
+LATENCY_SAMPLES = 500
+
+
+def percentile_ms(sorted_seconds: list[float], p: float) -> float:
+    if not sorted_seconds:
+        return 0.0
+    return sorted_seconds[min(len(sorted_seconds) - 1, int(p * len(sorted_seconds)))] * 1000
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "p50_ms": percentile_ms(latencies, 0.5),
+            "p95_ms": percentile_ms(latencies, 0.95),
+            "max_ms": percentile_ms(latencies, 1.0),
+        }
+
+
+class PolygonClient:
+    """
+    A process-wide wrapper around one polygon RESTClient.
+
+    The RESTClient's urllib3 pool keeps connections alive, so calls after the first skip the
+    TCP and TLS handshakes. Concurrent calls are bounded by a semaphore, transient failures
+    (connection errors, timeouts, 429s and 5xxs) are retried with full-jitter exponential
+    backoff, and each endpoint's latency is recorded.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = polygon_api_key,
+        max_concurrency: int = POLYGON_MAX_CONCURRENCY,
+        retries: int = POLYGON_RETRIES,
+        backoff: float = POLYGON_BACKOFF_SECONDS,
+    ):
+        # retries=0 hands retrying over to us, so that backoff can be jittered across processes
+        self.client = RESTClient(
+            api_key,
+            connect_timeout=POLYGON_TIMEOUT_SECONDS,
+            read_timeout=POLYGON_TIMEOUT_SECONDS,
+            retries=0,
+        )
+        # num_pools only counts per-host pools; each pool keeps a single connection unless told
+        # otherwise, so size the api.polygon.io pool to the calls allowed at once and keep them alive
+        self.client.client.connection_pool_kw["maxsize"] = max_concurrency
+        self.client.client.connection_pool_kw["block"] = True
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._stats: dict[str, EndpointStats] = {}
+
+    def call(self, endpoint: str, *args, **kwargs):
+        """Call a RESTClient method by name, e.g. call("get_snapshot_all", "stocks", tickers=symbols)"""
+        method = getattr(self.client, endpoint)
+        stats = self._stats.setdefault(endpoint, EndpointStats())
+        for attempt in range(self.retries + 1):
+            with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    result = method(*args, **kwargs)
+                except HTTPError:
+                    stats.errors += 1
+                    if attempt == self.retries:
+                        raise
+                else:
+                    stats.calls += 1
+                    stats.latencies.append(time.perf_counter() - start)
+                    return result
+            stats.retries += 1
+            time.sleep(random.uniform(0, self.backoff * 2**attempt))
+
+    async def acall(self, endpoint: str, *args, **kwargs):
+        """The same as call, run on a worker thread so that it doesn't block the event loop"""
+        return await asyncio.to_thread(self.call, endpoint, *args, **kwargs)
+
+    def stats(self) -> dict[str, dict]:
+        return {endpoint: stats.summary() for endpoint, stats in self._stats.items()}
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def polygon_client() -> PolygonClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = PolygonClient()
+    return _client
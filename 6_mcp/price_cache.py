@@ -0,0 +1,195 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock, so each process just keeps its own cache
+    fcntl = None
+
+load_dotenv(override=True)
+
+PRICE_CACHE_FILE = os.getenv("PRICE_CACHE_FILE", "price_cache.bin")
+PRICE_CACHE_SLOTS = int(os.getenv("PRICE_CACHE_SLOTS", "8192"))
+
+MAGIC = b"PRC1"
+HEADER = struct.Struct("<4sI8x")  # magic, number of slots
+SLOT = struct.Struct("<I4x16sdd")  # sequence, symbol, price, fetched at (epoch seconds)
+SEQUENCE = struct.Struct("<I")
+EMPTY = b"\0" * 16
+MAX_PROBES = 32
+READ_RETRIES = 100
+
+
+class SharedPriceCache:
+    """
+    A fixed-size hash table of prices in a memory-mapped file, shared by every process on the host.
+
+    Readers never lock. Each slot carries a sequence number that a writer makes odd before it
+    changes the slot and even again afterwards; a reader retries if it sees an odd number, or
+    if the number changed while it was copying the slot (a seqlock).
+    Writers serialize on an exclusive flock of the file, held only for as long as it takes to
+    claim or publish slots. A process about to fetch a missing symbol from upstream claims it
+    first, and the others wait for what it publishes rather than fetching it too.
+    """
+
+    def __init__(self, path: str = PRICE_CACHE_FILE, slots: int = PRICE_CACHE_SLOTS):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._open(slots)
+
+    def _open(self, slots: int) -> None:
+        # flock only excludes other open file descriptions, so each process opens the file itself
+        self._pid = os.getpid()
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < HEADER.size:
+                os.ftruncate(self._fd, HEADER.size + slots * SLOT.size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, slots), 0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        magic, self.slots = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a price cache file")
+        self._mm = mmap.mmap(self._fd, HEADER.size + self.slots * SLOT.size)
+
+    def close(self) -> None:
+        self._mm.close()
+        os.close(self._fd)
+
+    @contextmanager
+    def _locked(self):
+        if self._pid != os.getpid():
+            self._open(self.slots)
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def writer(self):
+        """Hold the single-writer lock; re-check the cache inside it before fetching upstream"""
+        return self._locked()
+
+    def _offset(self, index: int) -> int:
+        return HEADER.size + index * SLOT.size
+
+    def _probe(self, key: bytes):
+        start = zlib.crc32(key) % self.slots
+        for i in range(min(MAX_PROBES, self.slots)):
+            yield (start + i) % self.slots
+
+    def _read_slot(self, index: int) -> tuple[bytes, float, float] | None:
+        offset = self._offset(index)
+        for _ in range(READ_RETRIES):
+            (before,) = SEQUENCE.unpack_from(self._mm, offset)
+            if before & 1:
+                continue
+            _, key, price, fetched_at = SLOT.unpack_from(self._mm, offset)
+            (after,) = SEQUENCE.unpack_from(self._mm, offset)
+            if before == after:
+                return key, price, fetched_at
+        return None
+
+    def get(self, symbol: str) -> tuple[float, float] | None:
+        """Return (price, fetched_at) for the symbol, or None if it isn't cached"""
+        key = symbol.encode()
+        if len(key) > len(EMPTY):
+            return None
+        key = key.ljust(len(EMPTY), b"\0")
+        for index in self._probe(key):
+            slot = self._read_slot(index)
+            if slot is None or slot[0] == EMPTY:
+                return None
+            if slot[0] == key:
+                return slot[1], slot[2]
+        return None
+
+    def get_fresh(self, symbols, max_age: float) -> dict[str, tuple[float, float]]:
+        now = time.time()
+        fresh = {}
+        for symbol in symbols:
+            cached = self.get(symbol)
+            if cached and now - cached[1] < max_age:
+                fresh[symbol] = cached
+        return fresh
+
+    def claim(
+        self, symbols, claim_seconds: float
+    ) -> tuple[dict[str, tuple[float, float] | None], list[str]]:
+        """
+        Claim symbols for this caller to fetch; the caller must hold the writer lock. A claim
+        keeps the slot's price but negates the time, so the slot reads as stale to everyone
+        while it is being fetched. A claim older than claim_seconds is abandoned and taken over.
+
+        Returns:
+            tuple: What each claimed slot held before, for release(), and the symbols that
+            another caller has already claimed
+        """
+        now = time.time()
+        claimed, elsewhere = {}, []
+        for symbol in symbols:
+            cached = self.get(symbol)
+            if self._is_claim(cached, claim_seconds):
+                elsewhere.append(symbol)
+                continue
+            claimed[symbol] = cached
+            self.put(symbol, cached[0] if cached else 0.0, -now)
+        return claimed, elsewhere
+
+    @staticmethod
+    def _is_claim(cached: tuple[float, float] | None, claim_seconds: float) -> bool:
+        return bool(cached) and cached[1] < 0 and time.time() + cached[1] < claim_seconds
+
+    def is_claimed(self, symbol: str, claim_seconds: float) -> bool:
+        """Whether someone is fetching the symbol right now"""
+        return self._is_claim(self.get(symbol), claim_seconds)
+
+    def release(self, claimed: dict[str, tuple[float, float] | None]) -> None:
+        """Give up claims without publishing, restoring what the slots held; hold the writer lock"""
+        for symbol, previous in claimed.items():
+            price, fetched_at = previous or (0.0, 0.0)
+            self.put(symbol, price, max(fetched_at, 0.0))
+
+    def put(self, symbol: str, price: float, fetched_at: float) -> None:
+        """Publish a price; the caller must hold the writer lock"""
+        key = symbol.encode()
+        if len(key) > len(EMPTY):
+            return
+        key = key.ljust(len(EMPTY), b"\0")
+        target, oldest = None, None
+        for index in self._probe(key):
+            _, slot_key, _, slot_fetched_at = SLOT.unpack_from(self._mm, self._offset(index))
+            if slot_key in (key, EMPTY):
+                target = index
+                break
+            # Evict the oldest price; a claimed slot, whose time is negative, only if all are claimed,
+            # since evicting it would send whoever waits on the claim to fetch the symbol again
+            age = (slot_fetched_at < 0, abs(slot_fetched_at))
+            if oldest is None or age < oldest[1]:
+                oldest = (index, age)
+        if target is None:
+            target = oldest[0]
+        offset = self._offset(target)
+        (sequence,) = SEQUENCE.unpack_from(self._mm, offset)
+        writing = (sequence + 1) & 0xFFFFFFFF
+        SEQUENCE.pack_into(self._mm, offset, writing)
+        SLOT.pack_into(self._mm, offset, writing, key, price, fetched_at)
+        SEQUENCE.pack_into(self._mm, offset, (writing + 1) & 0xFFFFFFFF)
+
+
+def open_shared_price_cache() -> SharedPriceCache | None:
+    if fcntl is None:
+        return None
+    try:
+        return SharedPriceCache()
+    except (OSError, ValueError) as e:
+        print(f"Not sharing prices between processes due to {e}")
+        return None
@@ -0,0 +1,223 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from polygon import WebSocketClient
+from polygon.websocket.models import EquityAgg, EquityTrade, Feed, Market
+from dotenv import load_dotenv
+from database import read_held_symbols
+from market import is_realtime_polygon, publish_prices
+
+load_dotenv(override=True)
+
+polygon_api_key = os.getenv("POLYGON_API_KEY")
+
+# Where streamed quotes come from: "polygon", "file:<path>" for a JSONL replay file,
+# or "tcp://<host>:<port>" for a socket sending newline-delimited JSON quotes
+PRICE_FEED = os.getenv("PRICE_FEED", "polygon" if is_realtime_polygon else "")
+# Symbols to stream in addition to everything an account holds, comma separated
+PRICE_FEED_WATCHLIST = [s.strip().upper() for s in os.getenv("PRICE_FEED_WATCHLIST", "").split(",") if s.strip()]
+# How much faster than real time a replay file is played back; 0 plays it as fast as possible
+PRICE_FEED_REPLAY_SPEED = float(os.getenv("PRICE_FEED_REPLAY_SPEED", "0"))
+
+SUBSCRIPTION_REFRESH_SECONDS = 60
+RECONNECT_SECONDS = 5
+PUBLISH_BATCH = 100
+
+
+def watched_symbols() -> set[str]:
+    return set(read_held_symbols()) | set(PRICE_FEED_WATCHLIST)
+
+
+class PriceFeed:
+    """
+    Streams quotes on a daemon thread into the quote book: this process's price cache and the
+    mmap cache shared with the MCP servers on this host. While a symbol keeps ticking,
+    lookup_share_price, Account.buy_shares and valuations find it there without a network call.
+    """
+
+    def __init__(self):
+        self.updates = 0
+        self.last_update = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "PriceFeed":
+        self._thread = threading.Thread(target=self.run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self) -> None:
+        raise NotImplementedError
+
+    def publish(self, prices: dict[str, float]) -> None:
+        if prices:
+            publish_prices(prices)
+            self.updates += len(prices)
+            self.last_update = time.time()
+
+    def stats(self) -> dict:
+        return {"feed": type(self).__name__, "updates": self.updates, "last_update": self.last_update}
+
+
+class PolygonFeed(PriceFeed):
+    """
+    Polygon's real-time trades websocket, subscribed to held and watched symbols. The client
+    is only touched from its own event loop; other threads hand it work through that loop.
+    """
+
+    def __init__(self, api_key: str | None = polygon_api_key):
+        super().__init__()
+        self.api_key = api_key
+        self.subscribed: set[str] = set()
+        self.client = None
+        self._subscriptions_lock = threading.Lock()
+        self._loop = None
+
+    def run(self) -> None:
+        with self._subscriptions_lock:
+            self.subscribed = watched_symbols()
+            subscriptions = [f"T.{symbol}" for symbol in self.subscribed]
+        self.client = WebSocketClient(
+            api_key=self.api_key,
+            feed=Feed.RealTime,
+            market=Market.Stocks,
+            subscriptions=subscriptions,
+        )
+        asyncio.run(self._stream())
+
+    async def _stream(self) -> None:
+        # What client.run does, but keeping hold of the loop so other threads can reach the socket
+        self._loop = asyncio.get_running_loop()
+        threading.Thread(target=self._refresh_subscriptions, daemon=True).start()
+        await self.client.connect(self._handle)
+
+    def _refresh_subscriptions(self) -> None:
+        """Follow the accounts' holdings as traders buy and sell, and close the socket once stopped"""
+        while not self._stop.wait(SUBSCRIPTION_REFRESH_SECONDS):
+            try:
+                symbols = watched_symbols()
+            except Exception as e:
+                print(f"Was not able to refresh price feed subscriptions due to {e}")
+                continue
+            self._loop.call_soon_threadsafe(self._resubscribe, symbols)
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop)
+
+    def _resubscribe(self, symbols: set[str]) -> None:
+        with self._subscriptions_lock:
+            if added := symbols - self.subscribed:
+                self.client.subscribe(*[f"T.{symbol}" for symbol in added])
+            if removed := self.subscribed - symbols:
+                self.client.unsubscribe(*[f"T.{symbol}" for symbol in removed])
+            self.subscribed = symbols
+
+    async def _handle(self, messages) -> None:
+        prices = {}
+        for message in messages:
+            if isinstance(message, EquityTrade) and message.price:
+                prices[message.symbol] = message.price
+            elif isinstance(message, EquityAgg) and message.close:
+                prices[message.symbol] = message.close
+        self.publish(prices)
+
+
+class LineFeed(PriceFeed):
+    """Newline-delimited JSON quotes, each like {"symbol": "AAPL", "price": 201.5, "timestamp": 1718000000.0}"""
+
+    def _consume(self, lines, speed: float = 0, batch_size: int = 1) -> None:
+        batch, previous = {}, None
+        for line in lines:
+            if self._stop.is_set():
+                break
+            if not line.strip():
+                continue
+            try:
+                quote = json.loads(line)
+                symbol, price = quote["symbol"].upper(), float(quote["price"])
+            except (ValueError, KeyError, AttributeError) as e:
+                print(f"Skipping malformed price feed line {line.strip()!r} due to {e}")
+                continue
+            timestamp = quote.get("timestamp")
+            if speed and timestamp is not None:
+                if previous is not None and timestamp > previous:
+                    self.publish(batch)
+                    batch = {}
+                    self._stop.wait((timestamp - previous) / speed)
+                previous = timestamp
+            batch[symbol] = price
+            if len(batch) >= batch_size:
+                self.publish(batch)
+                batch = {}
+        self.publish(batch)
+
+
+class ReplayFileFeed(LineFeed):
+    """Plays back a recorded JSONL file of quotes, paced by their timestamps if speed is set"""
+
+    def __init__(self, path: str, speed: float = PRICE_FEED_REPLAY_SPEED):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+
+    def run(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            self._consume(f, self.speed, 1 if self.speed else PUBLISH_BATCH)
+
+
+class SocketFeed(LineFeed):
+    """Reads quotes from a TCP socket, reconnecting until stopped; a local stand-in for a vendor feed"""
+
+    def __init__(self, host: str, port: int):
+        super().__init__()
+        self.host = host
+        self.port = port
+
+    def run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection((self.host, self.port)) as conn:
+                    with conn.makefile("r", encoding="utf-8") as lines:
+                        self._consume(lines)
+            except OSError as e:
+                print(f"Price feed connection to {self.host}:{self.port} failed due to {e}")
+            self._stop.wait(RECONNECT_SECONDS)
+
+
+def open_price_feed(spec: str = PRICE_FEED) -> PriceFeed | None:
+    if not spec:
+        return None
+    if spec == "polygon":
+        return PolygonFeed()
+    if spec.startswith("file:"):
+        return ReplayFileFeed(spec[len("file:") :])
+    if spec.startswith("tcp://"):
+        host, _, port = spec[len("tcp://") :].rpartition(":")
+        return SocketFeed(host, int(port))
+    raise ValueError(f"Unknown PRICE_FEED {spec!r}")
+
+
+def start_price_feed(spec: str = PRICE_FEED) -> PriceFeed | None:
+    """Start the configured feed, if any, in the background"""
+    feed = open_price_feed(spec)
+    return feed.start() if feed else None
+
+
+if __name__ == "__main__":
+    feed = start_price_feed()
+    if feed is None:
+        print("No PRICE_FEED is configured")
+    else:
+        print(f"Streaming prices from {PRICE_FEED}")
+        try:
+            while feed._thread.is_alive():
+                feed._thread.join(SUBSCRIPTION_REFRESH_SECONDS)
+                print(feed.stats())
+        except KeyboardInterrupt:
+            feed.stop()
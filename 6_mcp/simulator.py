@@ -0,0 +1,182 @@
+import os
+import zlib
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+MARKET_SIMULATOR_SEED = int(os.getenv("MARKET_SIMULATOR_SEED", "42"))
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+SESSION_OPEN = time(9, 30)
+SESSION_MINUTES = 390
+TRADING_DAYS_PER_YEAR = 252
+
+# Day 0 of every simulated history; each symbol starts here at its own initial price
+EPOCH = date(2020, 1, 1)
+# Daily history is generated this many trading days at a time
+HORIZON_CHUNK = 256
+
+
+def symbol_key(symbol: str) -> int:
+    return zlib.crc32(symbol.encode())
+
+
+class MarketSimulator:
+    """
+    A seeded, reproducible market of any symbols you ask for.
+
+    Each symbol follows a geometric Brownian motion whose daily shocks are correlated with a
+    single market factor, with a start price, drift, volatility and market correlation drawn
+    from a generator seeded by (seed, symbol). Intraday minute prices are a Brownian bridge
+    between one day's close and the next. A symbol's path depends only on the seed and the
+    symbol, so every process, and every call, sees the same prices for the same moment.
+    """
+
+    def __init__(self, seed: int = MARKET_SIMULATOR_SEED):
+        self.seed = seed
+        self.horizon = 0
+        self.market_shocks = np.empty(0)
+        self.rows: dict[str, int] = {}
+        self.start_price = np.empty(0)
+        self.drift = np.empty(0)
+        self.volatility = np.empty(0)
+        self.correlation = np.empty(0)
+        self.log_closes = np.empty((0, 0))
+        self.paths_day = None
+        self.paths: dict[str, np.ndarray] = {}
+
+    def _symbol_rng(self, symbol: str, *extra: int) -> np.random.Generator:
+        return np.random.default_rng([self.seed, symbol_key(symbol), *extra])
+
+    def _extend_horizon(self, day_index: int) -> None:
+        horizon = (day_index // HORIZON_CHUNK + 1) * HORIZON_CHUNK
+        market_rng = np.random.default_rng([self.seed])
+        self.market_shocks = market_rng.standard_normal(horizon)
+        symbols = list(self.rows)
+        self.horizon = horizon
+        self.rows = {}
+        self.start_price = np.empty(0)
+        self.drift = np.empty(0)
+        self.volatility = np.empty(0)
+        self.correlation = np.empty(0)
+        self.log_closes = np.empty((0, horizon))
+        self._add_symbols(symbols)
+
+    def _add_symbols(self, symbols: list[str]) -> None:
+        if not symbols:
+            return
+        params = np.empty((len(symbols), 4))
+        shocks = np.empty((len(symbols), self.horizon))
+        for i, symbol in enumerate(symbols):
+            rng = self._symbol_rng(symbol)
+            params[i] = rng.uniform(size=4)
+            shocks[i] = rng.standard_normal(self.horizon)
+        start_price = np.exp(np.log(10) + params[:, 0] * np.log(50))
+        drift = 0.02 + params[:, 1] * 0.14
+        volatility = 0.15 + params[:, 2] * 0.45
+        correlation = 0.2 + params[:, 3] * 0.6
+
+        dt = 1 / TRADING_DAYS_PER_YEAR
+        correlated = (
+            correlation[:, None] * self.market_shocks[None, :]
+            + np.sqrt(1 - correlation**2)[:, None] * shocks
+        )
+        returns = (drift - volatility**2 / 2)[:, None] * dt + volatility[:, None] * np.sqrt(dt) * correlated
+        log_closes = np.log(start_price)[:, None] + np.cumsum(returns, axis=1)
+
+        first = len(self.rows)
+        self.rows.update({symbol: first + i for i, symbol in enumerate(symbols)})
+        self.start_price = np.concatenate([self.start_price, start_price])
+        self.drift = np.concatenate([self.drift, drift])
+        self.volatility = np.concatenate([self.volatility, volatility])
+        self.correlation = np.concatenate([self.correlation, correlation])
+        self.log_closes = np.vstack([self.log_closes, log_closes])
+
+    def _ensure(self, symbols: list[str], day_index: int) -> np.ndarray:
+        if day_index >= self.horizon:
+            self._extend_horizon(day_index)
+        self._add_symbols([symbol for symbol in dict.fromkeys(symbols) if symbol not in self.rows])
+        return np.array([self.rows[symbol] for symbol in symbols], dtype=np.intp)
+
+    @staticmethod
+    def day_index(day: date) -> int:
+        """The number of weekdays between the epoch and the given day"""
+        return int(np.busday_count(EPOCH, day))
+
+    def _previous_log_closes(self, rows: np.ndarray, day_index: int) -> np.ndarray:
+        if day_index == 0:
+            return np.log(self.start_price[rows])
+        return self.log_closes[rows, day_index - 1]
+
+    def closes(self, symbols: list[str], day: date) -> np.ndarray:
+        """The closing price of each symbol on the given trading day"""
+        index = self.day_index(day)
+        rows = self._ensure(symbols, index)
+        return np.exp(self.log_closes[rows, index])
+
+    def intraday_paths(self, symbols: list[str], day: date) -> np.ndarray:
+        """
+        Minute prices for each symbol through the given trading day, shaped
+        (symbols, SESSION_MINUTES + 1), from the previous close to this day's close.
+        """
+        if self.paths_day != day:
+            self.paths_day, self.paths = day, {}
+        new_symbols = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.paths]
+        if new_symbols:
+            self.paths.update(zip(new_symbols, self._bridge(new_symbols, day)))
+        return np.array([self.paths[symbol] for symbol in symbols])
+
+    def _bridge(self, symbols: list[str], day: date) -> np.ndarray:
+        index = self.day_index(day)
+        rows = self._ensure(symbols, index)
+        start = self._previous_log_closes(rows, index)
+        end = self.log_closes[rows, index]
+
+        noise = np.empty((len(symbols), SESSION_MINUTES))
+        for i, symbol in enumerate(symbols):
+            noise[i] = self._symbol_rng(symbol, index).standard_normal(SESSION_MINUTES)
+        walk = np.concatenate([np.zeros((len(symbols), 1)), np.cumsum(noise, axis=1)], axis=1)
+        fraction = np.linspace(0, 1, SESSION_MINUTES + 1)
+        bridge = (walk - fraction[None, :] * walk[:, -1:]) / np.sqrt(SESSION_MINUTES)
+        daily_volatility = self.volatility[rows] / np.sqrt(TRADING_DAYS_PER_YEAR)
+        log_path = (
+            start[:, None] * (1 - fraction)[None, :]
+            + end[:, None] * fraction[None, :]
+            + daily_volatility[:, None] * bridge
+        )
+        return np.exp(log_path)
+
+    def prices(self, symbols, at: datetime | None = None) -> dict[str, float]:
+        """
+        The price of each symbol at the given moment, or now.
+        Outside the session this is the close of the most recent weekday.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        if not symbols:
+            return {}
+        at = (at or datetime.now(EXCHANGE_TZ)).astimezone(EXCHANGE_TZ)
+        day = at.date()
+        minutes = (at - datetime.combine(day, SESSION_OPEN, EXCHANGE_TZ)).total_seconds() // 60
+        if not np.is_busday(day) or minutes < 0:
+            day = np.busday_offset(day, -1, roll="forward").astype(date)
+            minutes = SESSION_MINUTES
+        if day < EPOCH:
+            day, minutes = EPOCH, SESSION_MINUTES
+        if minutes >= SESSION_MINUTES:
+            values = self.closes(symbols, day)
+        else:
+            values = self.intraday_paths(symbols, day)[:, int(minutes)]
+        return {symbol: round(float(value), 2) for symbol, value in zip(symbols, values)}
+
+
+_simulator = None
+
+
+def simulated_prices(symbols, at: datetime | None = None) -> dict[str, float]:
+    global _simulator
+    if _simulator is None:
+        _simulator = MarketSimulator()
+    return _simulator.prices(symbols, at)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+from agents.mcp import MCPServer, MCPServerSse, MCPServerStdio, MCPServerStreamableHttp
+from dotenv import load_dotenv
+from mcp_transport import is_sse_url
+
+load_dotenv(override=True)
+
+# How often every supervised server is pinged, and restarted if it does not answer
+SUPERVISOR_HEALTH_CHECK_SECONDS = float(os.getenv("SUPERVISOR_HEALTH_CHECK_SECONDS", "30"))
+PING_TIMEOUT_SECONDS = 5
+CLIENT_SESSION_TIMEOUT_SECONDS = 120
+
+
+def open_mcp_server(params: dict) -> MCPServer:
+    """A client for params with a url, served over HTTP, or with a command to spawn over stdio"""
+    options = {"cache_tools_list": True, "client_session_timeout_seconds": CLIENT_SESSION_TIMEOUT_SECONDS}
+    if "url" not in params:
+        return MCPServerStdio(params, **options)
+    if is_sse_url(params["url"]):
+        return MCPServerSse(params, **options)
+    return MCPServerStreamableHttp(params, **options)
+
+
+class SupervisedServer:
+    """
+    One MCP server process, or connection to a shared HTTP server, kept open for as long as the
+    supervisor is. The agents SDK's server must be connected and cleaned up in the same task,
+    so a background task holds it.
+    """
+
+    def __init__(self, params: dict):
+        self.params = params
+        self.name = params.get("url") or " ".join([params["command"], *params.get("args", [])])
+        self.server: MCPServer | None = None
+        self.startup_seconds = None
+        self.started_at = None
+        self.starts = 0
+        self.healthy_at = None
+        self.last_error = None
+        self._stop = asyncio.Event()
+        self._task = None
+
+    async def start(self) -> None:
+        ready, self._stop = asyncio.Event(), asyncio.Event()
+        self._task = asyncio.create_task(self._hold(ready, self._stop))
+        await ready.wait()
+        if self.server is None:
+            raise ConnectionError(f"Could not start MCP server {self.name}: {self.last_error}")
+
+    async def _hold(self, ready: asyncio.Event, stop: asyncio.Event) -> None:
+        began = time.perf_counter()
+        held = None
+        try:
+            async with open_mcp_server(self.params) as server:
+                held = self.server = server
+                self.startup_seconds = time.perf_counter() - began
+                self.started_at = time.time()
+                self.starts += 1
+                self.healthy_at = self.started_at
+                ready.set()
+                await stop.wait()
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+        finally:
+            if self.server is held:
+                self.server = None
+            ready.set()
+
+    async def healthy(self) -> bool:
+        if self.server is None or self._task is None or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.server.session.send_ping(), PING_TIMEOUT_SECONDS)
+            self.healthy_at = time.time()
+            return True
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+            return False
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task and not self._task.done():
+            await asyncio.wait([self._task], timeout=PING_TIMEOUT_SECONDS)
+
+    def status(self) -> dict:
+        return {
+            "server": self.name,
+            "running": self.server is not None,
+            "startup_seconds": self.startup_seconds,
+            "started_at": self.started_at,
+            "healthy_at": self.healthy_at,
+            "restarts": max(self.starts - 1, 0),
+            "last_error": self.last_error,
+        }
+
+
+class MCPSupervisor:
+    """
+    Starts each distinct MCP server once and hands the running server to every trader that
+    asks for it, so a trading cycle spawns no processes. MCP sessions carry concurrent
+    requests, so traders share a server safely. A background check pings each server and
+    restarts any that has died, and servers are checked again before they are handed out.
+    """
+
+    def __init__(self):
+        self.servers: dict[str, SupervisedServer] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._monitor = None
+        self._loop = None
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Servers started under an earlier event loop ended with it
+            self._loop = loop
+            self.servers = {}
+            self._locks = {}
+            self._monitor = loop.create_task(self._check_periodically())
+
+    async def _ready(self, params: dict) -> MCPServer:
+        key = json.dumps(params, sort_keys=True)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            supervised = self.servers.get(key)
+            if supervised is None:
+                supervised = self.servers[key] = SupervisedServer(params)
+                await supervised.start()
+            elif not await supervised.healthy():
+                await self._restart(supervised)
+            return supervised.server
+
+    async def _restart(self, supervised: SupervisedServer) -> None:
+        print(f"Restarting MCP server {supervised.name} ({supervised.last_error})")
+        await supervised.stop()
+        await supervised.start()
+
+    async def get(self, params_list: list[dict]) -> list[MCPServer]:
+        """Running servers for these parameters, starting any that are not running yet"""
+        self._bind_loop()
+        return list(await asyncio.gather(*[self._ready(params) for params in params_list]))
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(SUPERVISOR_HEALTH_CHECK_SECONDS)
+            for key, supervised in list(self.servers.items()):
+                async with self._locks[key]:
+                    if not await supervised.healthy():
+                        try:
+                            await self._restart(supervised)
+                        except Exception as e:
+                            print(f"Was not able to restart MCP server {supervised.name} due to {e}")
+
+    def status(self) -> list[dict]:
+        return [supervised.status() for supervised in self.servers.values()]
+
+    def report(self) -> str:
+        """One line per server: whether it is up, how long it took to start, and its restarts"""
+        lines = []
+        for status in self.status():
+            state = "up" if status["running"] else f"down ({status['last_error']})"
+            startup = f"{status['startup_seconds']:.1f}s" if status["startup_seconds"] is not None else "-"
+            lines.append(f"{status['server']}: {state}, started in {startup}, {status['restarts']} restarts")
+        return "\n".join(lines)
+
+    async def stop(self) -> None:
+        if self._monitor:
+            self._monitor.cancel()
+        await asyncio.gather(*[supervised.stop() for supervised in self.servers.values()])
+        self.servers = {}
+        self._loop = None
+
+
+mcp_supervisor = MCPSupervisor()
@@ -1,5 +1,5 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from log_writer import LogWriter
 import secrets
 import string
 
@@ -17,6 +17,9 @@ def make_trace_id(tag: str) -> str:
 
 class LogTracer(TracingProcessor):
 
+    def __init__(self):
+        self.writer = LogWriter()
+
     def get_name(self, trace_or_span: Trace | Span) -> str | None:
         trace_id = trace_or_span.trace_id
         name = trace_id.split("_")[1]
@@ -28,12 +31,12 @@ class LogTracer(TracingProcessor):
     def on_trace_start(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Started: {trace.name}")
+            self.writer.write(name, "trace", f"Started: {trace.name}")
 
     def on_trace_end(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Ended: {trace.name}")
+            self.writer.write(name, "trace", f"Ended: {trace.name}")
 
     def on_span_start(self, span) -> None:
         name = self.get_name(span)
@@ -49,7 +52,7 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.writer.write(name, type, message)
 
     def on_span_end(self, span) -> None:
         name = self.get_name(span)
@@ -66,10 +69,10 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.writer.write(name, type, message)
 
     def force_flush(self) -> None:
-        pass
+        self.writer.flush()
 
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        self.writer.shutdown()
\ No newline at end of file
@@ -4,7 +4,17 @@ import asyncio
 from tracers import LogTracer
 from agents import add_trace_processor
 from market import is_market_open
+from market_calendar import market_calendar, EXCHANGE_TZ
+from log_retention import run_retention
+from price_feed import start_price_feed
+from orders import start_order_matching, match_open_orders
+from supervisor import mcp_supervisor
+from database import DB, copy_market_history
+from clock import set_simulated_now
+from accounts import Account
+from reset import reset_traders
 from dotenv import load_dotenv
+from datetime import datetime, time, timedelta
 import os
 
 load_dotenv(override=True)
@@ -15,6 +25,13 @@ RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
 )
 USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
 
+# Setting REPLAY_START (and optionally REPLAY_END) replays those dates of stored market history
+# on a simulated clock, in a separate database (REPLAY_DB), instead of trading live
+REPLAY_START = os.getenv("REPLAY_START")
+REPLAY_END = os.getenv("REPLAY_END", "9999-12-31")
+REPLAY_SOURCE_DB = os.getenv("REPLAY_SOURCE_DB", "accounts.db")
+REPLAY_TIMES = [time.fromisoformat(t.strip()) for t in os.getenv("REPLAY_TIMES", "10:00").split(",")]
+
 names = ["Warren", "George", "Ray", "Cathie"]
 lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
 
@@ -38,17 +55,73 @@ def create_traders() -> List[Trader]:
     return traders
 
 
+def seconds_until_next_run() -> float:
+    """Wait RUN_EVERY_N_MINUTES, or if the market will be closed by then, until it next opens"""
+    now = datetime.now(EXCHANGE_TZ)
+    wake = now + timedelta(minutes=RUN_EVERY_N_MINUTES)
+    if not RUN_EVEN_WHEN_MARKET_IS_CLOSED and not market_calendar.is_open(wake):
+        wake = market_calendar.next_open(wake)
+    return (wake - now).total_seconds()
+
+
 async def run_every_n_minutes():
     add_trace_processor(LogTracer())
+    start_order_matching()
+    start_price_feed()
     traders = create_traders()
     while True:
         if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
             await asyncio.gather(*[trader.run() for trader in traders])
+            print(mcp_supervisor.report())
         else:
             print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+        try:
+            for fill in await asyncio.to_thread(match_open_orders):
+                print(fill)
+        except Exception as e:
+            print(f"Was not able to match open orders due to {e}")
+        try:
+            await asyncio.to_thread(run_retention)
+        except Exception as e:
+            print(f"Was not able to archive old logs due to {e}")
+        seconds = seconds_until_next_run()
+        print(f"Next run in {seconds / 60:,.0f} minutes")
+        await asyncio.sleep(seconds)
+
+
+async def run_replay():
+    """
+    Run every trader once at each of REPLAY_TIMES on each stored market date, as fast as the
+    models respond. The simulated time is stored in the replay database, where the MCP servers
+    read it for share prices and transaction timestamps.
+    """
+    if os.path.abspath(DB) == os.path.abspath(REPLAY_SOURCE_DB):
+        raise ValueError(f"A replay must write to a different database than {REPLAY_SOURCE_DB}")
+    dates = copy_market_history(REPLAY_SOURCE_DB, REPLAY_START, REPLAY_END)
+    if not dates:
+        raise ValueError(f"No stored market data from {REPLAY_START} to {REPLAY_END} in {REPLAY_SOURCE_DB}")
+    add_trace_processor(LogTracer())
+    set_simulated_now(datetime.combine(datetime.fromisoformat(dates[0]).date(), REPLAY_TIMES[0]))
+    reset_traders()
+    traders = create_traders()
+    for date in dates:
+        for replay_time in REPLAY_TIMES:
+            set_simulated_now(datetime.combine(datetime.fromisoformat(date).date(), replay_time))
+            print(f"Replaying {date} {replay_time}")
+            for fill in match_open_orders():
+                print(fill)
+            await asyncio.gather(*[trader.run() for trader in traders])
+    print(mcp_supervisor.report())
+    await mcp_supervisor.stop()
+    for trader in traders:
+        account = Account.get(trader.name)
+        print(f"{trader.name}: portfolio value ${account.calculate_portfolio_value():,.2f}")
 
 
 if __name__ == "__main__":
-    print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes")
-    asyncio.run(run_every_n_minutes())
+    if REPLAY_START:
+        print(f"Replaying stored market history from {REPLAY_START} into {DB}")
+        asyncio.run(run_replay())
+    else:
+        print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes")
+        asyncio.run(run_every_n_minutes())
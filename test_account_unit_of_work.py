@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests that each accounts server tool call commits to the database exactly once,
+however many rows it writes. Runs against a throwaway database, never accounts.db.
+Run with `uv run test_account_unit_of_work.py`, or with pytest
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="unit_of_work_")
+os.environ["ACCOUNTS_DB"] = os.path.join(TEST_DIR, "accounts.db")
+os.environ["PRICE_CACHE_FILE"] = os.path.join(TEST_DIR, "price_cache.bin")
+os.environ["MARKET_SIMULATOR"] = "true"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "6_mcp"))
+
+import accounts_server
+import database
+from accounts import Account, Order
+
+NAME = "tester"
+
+
+def commits_made_by(tool, **args) -> int:
+    """Call an accounts server tool once and return how many transactions it committed"""
+    before = database.transaction_stats()["commits"]
+    asyncio.run(tool(NAME, **args))
+    return database.transaction_stats()["commits"] - before
+
+
+def setup_module():
+    Account.get(NAME).reset("Buy and hold")
+    Account.get(NAME).buy_shares("AAPL", 10, "Opening position")
+
+
+def test_trades_commit_once():
+    assert commits_made_by(accounts_server.buy_shares, symbol="MSFT", quantity=2, rationale="Test") == 1
+    assert commits_made_by(accounts_server.sell_shares, symbol="AAPL", quantity=1, rationale="Test") == 1
+    orders = [Order(symbol="AAPL", side="sell", quantity=1), Order(symbol="MSFT", side="buy", quantity=1)]
+    assert commits_made_by(accounts_server.submit_orders, orders=orders, rationale="Test") == 1
+
+
+def test_resting_orders_commit_once():
+    # A limit far below the market rests rather than filling, which would be a second unit of work
+    before = database.transaction_stats()["commits"]
+    placed = asyncio.run(accounts_server.place_order(NAME, "AAPL", "buy", "limit", 1, 1.0, "Test"))
+    assert database.transaction_stats()["commits"] - before == 1
+    order_id = int(placed.split()[3])
+    assert commits_made_by(accounts_server.cancel_order, order_id=order_id) == 1
+
+
+def test_account_updates_commit_once():
+    assert commits_made_by(accounts_server.change_strategy, strategy="Value") == 1
+    assert commits_made_by(accounts_server.get_positions) == 1
+
+
+def test_account_report_commits_once():
+    # The report records a portfolio value and a log entry
+    before = database.transaction_stats()["commits"]
+    asyncio.run(accounts_server.read_account_resource(NAME))
+    assert database.transaction_stats()["commits"] - before == 1
+
+
+def test_failed_trade_commits_nothing():
+    before = database.transaction_stats()
+    try:
+        asyncio.run(accounts_server.sell_shares(NAME, "NVDA", 1, "Test"))
+    except ValueError:
+        pass
+    after = database.transaction_stats()
+    assert after["commits"] == before["commits"]
+    assert after["rollbacks"] == before["rollbacks"] + 1
+
+
+if __name__ == "__main__":
+    setup_module()
+    for test in [
+        test_trades_commit_once,
+        test_resting_orders_commit_once,
+        test_account_updates_commit_once,
+        test_account_report_commits_once,
+        test_failed_trade_commits_nothing,
+    ]:
+        test()
+        print(f"✅ {test.__name__}")